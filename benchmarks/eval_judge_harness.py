@@ -0,0 +1,118 @@
+# benchmarks/eval_judge_harness.py
+# Offline check that the combined judge (one call) reports the same scores as
+# the four per-metric judges, and that a malformed combined answer falls back
+# to the per-metric path. Run with: python benchmarks/eval_judge_harness.py
+import json
+import sys
+import threading
+from types import SimpleNamespace
+
+from offline import enter_sandbox
+
+enter_sandbox()
+import eval_utils  # noqa: E402
+import llm_client  # noqa: E402
+from llm_cache import llm_cache  # noqa: E402
+from llm_scheduler import RateLimitScheduler  # noqa: E402
+
+# The stand-in judge has no provider limits, so don't let the scheduler throttle it.
+llm_client.scheduler = RateLimitScheduler(requests_per_minute=10**9, tokens_per_minute=10**12)
+
+SAMPLES = [
+    {
+        "name": "email_summary",
+        "output": "The sender asks to move Friday's review to Monday at 10am.",
+        "reference": "Hi, can we push Friday's design review to Monday 10am? Thanks, Ravi",
+        "input_struct": {"original_email": "Hi, can we push Friday's design review to Monday 10am? Thanks, Ravi"},
+        "scores": {"g_eval": 8, "if_eval": 5, "truthful_qa": 5, "halu_eval": 0},
+    },
+    {
+        "name": "draft_reply",
+        "output": "Dear Ravi, Monday 10am works. I have also booked the large conference room.",
+        "reference": "Hi, can we push Friday's design review to Monday 10am? Thanks, Ravi",
+        "input_struct": {
+            "sender": "ravi@example.com",
+            "subject": "Design review",
+            "original_message": "Hi, can we push Friday's design review to Monday 10am? Thanks, Ravi",
+            "user_intent": "Please reply professionally to this inquiry.",
+        },
+        "scores": {"g_eval": 6, "if_eval": 4, "truthful_qa": 4, "halu_eval": 1},
+    },
+    {
+        "name": "web_answer",
+        "output": "Python 3.12 was released in October 2023.",
+        "reference": "When was Python 3.12 released?",
+        "input_struct": None,
+        "scores": {"g_eval": 9, "if_eval": 5, "truthful_qa": 5},
+    },
+]
+
+PER_METRIC_MARKERS = {
+    "G-Eval:": ("g_eval", "G-Eval: {}/10"),
+    "IFEval:": ("if_eval", "IFEval: {}/5"),
+    "TruthfulQA:": ("truthful_qa", "TruthfulQA: {}/5"),
+    "HALUeval:": ("halu_eval", "HALUeval: {}"),
+}
+
+class StandInJudge:
+    # Answers judge prompts from a fixed score table, recognising the sample by
+    # its output text and the metric by the prompt's "Respond with" line.
+    def __init__(self, samples, malformed_combined=False):
+        self.samples = samples
+        self.malformed_combined = malformed_combined
+        self.calls = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+        sample = next(s for s in self.samples if s["output"] in prompt)
+        if "Respond with only a JSON object" in prompt:
+            content = "Scores look fine." if self.malformed_combined else json.dumps(sample["scores"])
+        else:
+            respond_line = prompt[prompt.rindex("Respond with:"):]
+            marker = next(m for m in PER_METRIC_MARKERS if m in respond_line)
+            key, template = PER_METRIC_MARKERS[marker]
+            content = template.format(sample["scores"][key])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def run_mode(mode, malformed_combined=False):
+    judge = StandInJudge(SAMPLES, malformed_combined)
+    llm_cache.clear()
+    llm_client.set_client(judge)
+    results = {
+        s["name"]: eval_utils.evaluate_all(s["output"], s["reference"], s["input_struct"], mode=mode).as_dict()
+        for s in SAMPLES
+    }
+    return results, judge
+
+def main():
+    per_metric, per_metric_judge = run_mode("per_metric")
+    combined, combined_judge = run_mode("combined")
+    fallback, fallback_judge = run_mode("combined", malformed_combined=True)
+
+    report = {
+        "samples": len(SAMPLES),
+        "combined_matches_per_metric": combined == per_metric,
+        "fallback_matches_per_metric": fallback == per_metric,
+        "calls": {
+            "per_metric": per_metric_judge.calls,
+            "combined": combined_judge.calls,
+            "combined_with_fallback": fallback_judge.calls,
+        },
+        "prompt_chars": {
+            "per_metric": per_metric_judge.prompt_chars,
+            "combined": combined_judge.prompt_chars,
+        },
+    }
+    if combined != per_metric:
+        report["mismatches"] = {n: {"per_metric": per_metric[n], "combined": combined[n]} for n in per_metric if per_metric[n] != combined[n]}
+    print(json.dumps(report, indent=2))
+    return 0 if report["combined_matches_per_metric"] and report["fallback_matches_per_metric"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# benchmarks/html_extract.py
+# Micro-benchmark for html_text against the extraction it replaced
+# (BeautifulSoup with html.parser, then a [:15000] cut). Every backend runs
+# over a corpus of saved pages, by default benchmarks/fixtures/*.html, and
+# the report gives the median milliseconds per page and the characters kept.
+#
+#   python benchmarks/html_extract.py --repeat 20
+#   python benchmarks/html_extract.py --corpus ~/saved_pages --inflate 20
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+import html_text  # noqa: E402
+
+FIXTURES = os.path.join(REPO_ROOT, "benchmarks", "fixtures")
+MAX_CHARS = 15000
+
+def legacy_bs4(html, max_chars):
+    # web_utils.extract_text_from_url before html_text.
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    text = soup.get_text(separator="\n")
+    return "\n".join([line.strip() for line in text.splitlines() if line.strip()])[:max_chars]
+
+def legacy_html2text(html, max_chars):
+    # gmail_utils.extract_plain_text_from_msg before html_text (it had no cut).
+    import html2text
+    return html2text.html2text(html)
+
+def available_extractors():
+    extractors = {}
+    for name, fn in (("legacy_bs4", legacy_bs4), ("legacy_html2text", legacy_html2text)):
+        try:
+            fn("<p>x</p>", MAX_CHARS)
+            extractors[name] = fn
+        except ImportError:
+            pass
+    for backend in html_text.BACKENDS:
+        extractors[backend] = lambda html, max_chars, backend=backend: html_text.extract(html, max_chars, backend)
+    return extractors
+
+def load_corpus(directories, inflate):
+    pages = {}
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, "*.htm*"))):
+            with open(path, encoding="utf-8", errors="replace") as f:
+                pages[os.path.basename(path)] = f.read()
+    if inflate > 1:
+        # A long page: every body repeated, the case where stopping early pays off.
+        pages[f"inflated_x{inflate}"] = "<html><body>" + "".join(pages.values()) * inflate + "</body></html>"
+    return pages
+
+def time_extractor(fn, html, max_chars, repeat):
+    samples, text = [], ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = fn(html, max_chars)
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 3), len(text)
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML-to-text extraction micro-benchmark.")
+    parser.add_argument("--corpus", action="append", help="directory of saved .html pages (repeatable)")
+    parser.add_argument("--repeat", type=int, default=10, help="runs per page; the median is reported")
+    parser.add_argument("--max-chars", type=int, default=MAX_CHARS, help="character budget passed to each extractor")
+    parser.add_argument("--inflate", type=int, default=10, help="also time one page made of the corpus repeated N times")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus or [FIXTURES], args.inflate)
+    if not pages:
+        parser.error("no .html pages found in the corpus")
+    extractors = available_extractors()
+    report = {"max_chars": args.max_chars, "repeat": args.repeat, "pages": {}}
+    for name, html in pages.items():
+        report["pages"][name] = {"bytes": len(html.encode("utf-8"))}
+        for extractor, fn in extractors.items():
+            ms, chars = time_extractor(fn, html, args.max_chars, args.repeat)
+            report["pages"][name][extractor] = {"median_ms": ms, "chars": chars}
+    report["total_ms"] = {
+        extractor: round(sum(page[extractor]["median_ms"] for page in report["pages"].values()), 3)
+        for extractor in extractors
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
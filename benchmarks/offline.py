@@ -0,0 +1,37 @@
+# benchmarks/offline.py
+# Lets the app modules be imported with no network and no real credentials:
+# a throwaway working directory gets a dummy .streamlit/secrets.toml, and the
+# repo root is put on sys.path.
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DUMMY_SECRETS = """
+[groq]
+api_key = "gsk_offline"
+
+[tavily]
+api_key = "tvly-offline"
+
+[zoom]
+client_id = "offline"
+client_secret = "offline"
+account_id = "offline"
+
+[gmail_oauth]
+client_id = "offline"
+client_secret = "offline"
+redirect_uri = "http://localhost"
+"""
+
+def enter_sandbox() -> str:
+    sandbox = tempfile.mkdtemp(prefix="assistant-offline-")
+    os.makedirs(os.path.join(sandbox, ".streamlit"))
+    with open(os.path.join(sandbox, ".streamlit", "secrets.toml"), "w") as f:
+        f.write(DUMMY_SECRETS)
+    os.chdir(sandbox)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    return sandbox
@@ -0,0 +1,409 @@
+# benchmarks/replay.py
+# Offline replay benchmark: runs each assistant pipeline against recorded
+# fixtures (benchmarks/fixtures) with local stand-ins for Groq, Gmail, Google
+# Calendar, Zoom, Tavily, retrieval and plain HTTP, and reports wall time, API
+# calls, token counts and peak memory per stage as JSON.
+#
+#   python benchmarks/replay.py --repeat 5 --output report.json
+#   python benchmarks/replay.py --baseline report.json   # exit 1 on regression
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+
+from offline import enter_sandbox
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+enter_sandbox()
+import httpx  # noqa: E402
+import pandas as pd  # noqa: E402
+import pytz  # noqa: E402
+import llm_client  # noqa: E402
+from llm_cache import llm_cache  # noqa: E402
+from llm_scheduler import RateLimitScheduler, estimate_tokens  # noqa: E402
+from eval_queue import eval_queue  # noqa: E402
+from eval_store import EvalStore, SQLiteBackend  # noqa: E402
+import gmail_utils  # noqa: E402
+from gmail_sync import GmailSync  # noqa: E402
+import calendar_utils  # noqa: E402
+import zoom_utils  # noqa: E402
+import meeting_scheduler  # noqa: E402
+import meeting_summary  # noqa: E402
+import web_utils  # noqa: E402
+import retrieval  # noqa: E402
+from context_builder import lexical_relevance  # noqa: E402
+
+# Stand-ins have no provider limits, so don't let the scheduler throttle them.
+llm_client.scheduler = RateLimitScheduler(requests_per_minute=10**9, tokens_per_minute=10**12)
+
+def load_json(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+def load_text(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+class Meter:
+    # Shared counters the stand-ins report into; reset at the start of each stage.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = Counter()
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def call(self, api, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            self.calls[api] += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+meter = Meter()
+
+class Request:
+    # Mimics a googleapiclient request object: the call is made on execute().
+    def __init__(self, api, response):
+        self.api = api
+        self.response = response
+
+    def execute(self):
+        meter.call(self.api)
+        return self.response
+
+class StandInGroq:
+    # Answers each prompt with the first fixture completion whose marker it contains.
+    def __init__(self, fixture, latency=0.0):
+        self.completions = fixture["completions"]
+        self.default = fixture["default"]
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        content = next((c["content"] for c in self.completions if c["match"] in prompt), self.default)
+        prompt_tokens = estimate_tokens(messages, 0)
+        completion_tokens = len(content) // 4
+        meter.call("groq", prompt_tokens, completion_tokens)
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+        )
+
+class StandInBatch:
+    # Mimics BatchHttpRequest: one metered call however many requests it holds.
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        meter.call("gmail")
+        for request_id, request in self.requests:
+            self.callback(request_id, request.response, None)
+
+class StandInGmail:
+    def __init__(self, fixture):
+        self.fixture = fixture
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def history(self):
+        return self
+
+    def getProfile(self, **kwargs):
+        return Request("gmail", {"historyId": self.fixture.get("historyId", "1")})
+
+    def new_batch_http_request(self, callback=None):
+        return StandInBatch(callback)
+
+    def list(self, **kwargs):
+        if "startHistoryId" in kwargs:
+            return Request("gmail", {"historyId": kwargs["startHistoryId"]})
+        return Request("gmail", self.fixture["list"])
+
+    def get(self, **kwargs):
+        return Request("gmail", self.fixture["message"])
+
+    def send(self, **kwargs):
+        return Request("gmail", {"id": "sent-" + kwargs["body"]["raw"][-12:]})
+
+class StandInCalendar:
+    # Fixture events are clock times; they are placed on today's date in Asia/Kolkata
+    # because find_free_slot_today only looks at today.
+    def __init__(self, fixture):
+        tz = pytz.timezone("Asia/Kolkata")
+        today = datetime.now(tz).date()
+
+        def at(clock):
+            hour, minute = map(int, clock.split(":"))
+            return tz.localize(datetime(today.year, today.month, today.day, hour, minute)).isoformat()
+
+        self.items = [
+            {"summary": e["summary"], "start": {"dateTime": at(e["start"])}, "end": {"dateTime": at(e["end"])}}
+            for e in fixture["events"]
+        ]
+
+    def events(self):
+        return self
+
+    def list(self, **kwargs):
+        return Request("calendar", {"items": self.items})
+
+    def insert(self, **kwargs):
+        return Request("calendar", {"id": "offline-event", "htmlLink": "https://calendar.google.com/event?eid=offline"})
+
+    def delete(self, **kwargs):
+        return Request("calendar", "")
+
+class StandInHTTP:
+    # Replaces the `requests` module inside zoom_utils; web pages are served
+    # through page_transport() instead.
+    def __init__(self, zoom_fixture, page_html):
+        self.zoom = zoom_fixture
+        self.page_html = page_html
+
+    def post(self, url, **kwargs):
+        if "oauth/token" in url:
+            meter.call("zoom")
+            return SimpleNamespace(status_code=200, json=lambda: self.zoom["token"])
+        if "api.zoom.us" in url:
+            meter.call("zoom")
+            return SimpleNamespace(status_code=201, json=lambda: self.zoom["meeting"])
+        raise RuntimeError(f"offline benchmark: unexpected POST {url}")
+
+    def delete(self, url, **kwargs):
+        if "api.zoom.us" in url:
+            meter.call("zoom")
+            return SimpleNamespace(status_code=204, json=lambda: {})
+        raise RuntimeError(f"offline benchmark: unexpected DELETE {url}")
+
+    def page_transport(self):
+        # Local HTTP stand-in for web_utils.page_fetcher. Answers conditional
+        # requests with 304 so revalidation is exercised too.
+        etag = '"web-page-fixture"'
+
+        def handle(request):
+            meter.call("http")
+            if request.headers.get("If-None-Match") == etag:
+                return httpx.Response(304, headers={"ETag": etag})
+            return httpx.Response(200, text=self.page_html, headers={"ETag": etag, "Content-Type": "text/html"})
+
+        return httpx.MockTransport(handle)
+
+class StandInTavily:
+    def __init__(self, fixture):
+        self.fixture = fixture
+
+    def search(self, **kwargs):
+        meter.call("tavily")
+        return self.fixture
+
+class StandInRetrieval:
+    # Ranks fixture rows by keyword overlap instead of embedding the query
+    # (Hugging Face) and searching Postgres.
+    def __init__(self, corpora):
+        self.corpora = corpora
+
+    def _text(self, row):
+        return " ".join(str(v) for v in row.values())
+
+    def search(self, name, query, k=retrieval.DEFAULT_TOP_K):
+        meter.call("retrieval")
+        df = pd.DataFrame(self.corpora[name])
+        df["distance"] = [1 - lexical_relevance(query, self._text(row)) for row in self.corpora[name]]
+        return df.sort_values("distance", kind="stable").head(k).reset_index(drop=True)
+
+    def rank_ids(self, name, query, ids, k=None):
+        meter.call("retrieval")
+        wanted = {int(i) for i in ids}
+        rows = [row for row in self.corpora[name] if int(row["id"]) in wanted]
+        rows.sort(key=lambda row: -lexical_relevance(query, self._text(row)))
+        return [int(row["id"]) for row in rows][:k or len(rows)]
+
+def transcripts_frame():
+    df = pd.DataFrame(load_json("transcripts.json")["rows"])
+    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
+    return df
+
+def web_visits_frame():
+    # Same shaping as web_utils.fetch_web_data.
+    df = pd.DataFrame(load_json("web_visits.json")["rows"])
+    df["visittime"] = pd.to_datetime(df["visittime"], errors="coerce")
+    df = df.dropna(subset=["visittime"])
+    df["visitDate"] = pd.to_datetime(df["visittime"].dt.date)
+    return df
+
+def install_stand_ins(llm_latency):
+    llm_client.set_client(StandInGroq(load_json("groq.json"), llm_latency))
+    gmail_fixture = load_json("gmail.json")
+    gmail_utils.get_gmail_service = lambda: StandInGmail(gmail_fixture)
+    http = StandInHTTP(load_json("zoom.json"), load_text("web_page.html"))
+    zoom_utils.requests = http
+    web_utils.page_fetcher.set_transport(http.page_transport())
+    web_utils.tavily_client = StandInTavily(load_json("tavily.json"))
+    stand_in = StandInRetrieval({"web": load_json("web_visits.json")["rows"],
+                                 "meetings": load_json("transcripts.json")["rows"]})
+    retrieval.search = stand_in.search
+    retrieval.rank_ids = stand_in.rank_ids
+
+WEB_PROMPTS = [
+    "Which site did Shikha visit most in September?",
+    "Which website links did Shikha click most often?",
+    "When was Python 3.13 released?",
+    "Summarize https://docs.python.org/3/library/asyncio.html in three bullet points",
+]
+
+INVITEES = [f"guest{i}@example.com" for i in range(30)]
+
+def build_stages():
+    calendar = StandInCalendar(load_json("calendar.json"))
+    zoom_utils.get_calendar_service = lambda: calendar
+    transcripts = transcripts_frame()
+    visits = web_visits_frame()
+    intent = "Please reply professionally to this inquiry."
+
+    def summarize_email():
+        email = gmail_utils.fetch_latest_email()
+        return gmail_utils.summarize_email(email["body"])
+
+    def draft_reply():
+        email = gmail_utils.fetch_latest_email()
+        return gmail_utils.draft_reply(email, intent)
+
+    def web_prompts():
+        return [web_utils.process_prompt_with_webdata(p, visits.copy()) for p in WEB_PROMPTS]
+
+    return {
+        "fetch_latest_email": gmail_utils.fetch_latest_email,
+        "summarize_email": summarize_email,
+        "draft_reply": draft_reply,
+        "find_free_slot_today": lambda: calendar_utils.find_free_slot_today(calendar, 30),
+        "schedule_zoom_meeting": lambda: zoom_utils.schedule_zoom_meeting(
+            "Design review", datetime(2026, 10, 19, 10, 0), 30, "Asia/Kolkata"),
+        "send_invitations": lambda: zoom_utils.send_invitations(
+            "📌 Zoom Meeting: Design review", {"time": "2026-10-19 10:00 AM", "link": "https://zoom.us/j/1"},
+            INVITEES),
+        "schedule_meeting": lambda: meeting_scheduler.schedule_meeting(
+            "Design review", datetime(2026, 10, 19, 10, 0), 30, "Asia/Kolkata", INVITEES),
+        "summarize_meetings": lambda: zoom_utils.summarize_meetings(transcripts),
+        "process_prompt_with_webdata": web_prompts,
+        "top_visited_websites": lambda: web_utils.top_visited_websites(visits.copy(), 2026, 9),
+    }
+
+def reset_state():
+    # Every repetition starts cold: no cached completions, meeting summaries, pages,
+    # mail or Zoom token and no remembered evaluations.
+    llm_cache.clear()
+    meeting_summary.summary_store = meeting_summary.SummaryStore(":memory:")
+    gmail_utils.inbox = GmailSync(gmail_utils.inbox.service_factory, gmail_utils.parse_message, ":memory:")
+    web_utils.page_fetcher.cache.clear()
+    zoom_utils.clear_zoom_token()
+    eval_queue.store = EvalStore(SQLiteBackend(":memory:"))
+
+def run_stage(fn):
+    reset_state()
+    meter.reset()
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    wall = time.perf_counter() - start
+    # Evaluations are deferred; wait for them so their judge calls are attributed to this stage.
+    eval_queue.drain()
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "wall_time_s": wall,
+        "wall_time_with_evals_s": total,
+        "api_calls": dict(meter.calls),
+        "prompt_tokens": meter.prompt_tokens,
+        "completion_tokens": meter.completion_tokens,
+        "peak_memory_kb": peak / 1024,
+    }
+
+def summarize_runs(runs):
+    return {
+        "wall_time_s": round(statistics.median(r["wall_time_s"] for r in runs), 4),
+        "wall_time_with_evals_s": round(statistics.median(r["wall_time_with_evals_s"] for r in runs), 4),
+        "api_calls": runs[-1]["api_calls"],
+        "prompt_tokens": runs[-1]["prompt_tokens"],
+        "completion_tokens": runs[-1]["completion_tokens"],
+        "peak_memory_kb": round(max(r["peak_memory_kb"] for r in runs), 1),
+    }
+
+# A metric regresses when it grows by more than the tolerance *and* by more than its noise floor.
+NOISE_FLOORS = {"wall_time_s": 0.05, "wall_time_with_evals_s": 0.05, "prompt_tokens": 0, "peak_memory_kb": 256}
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for name, stage in report["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        for metric, floor in NOISE_FLOORS.items():
+            old, new = base.get(metric), stage.get(metric)
+            if old is not None and new > old * (1 + tolerance) and new - old > floor:
+                regressions.append({"stage": name, "metric": metric, "baseline": old, "current": new})
+        old_calls, new_calls = sum(base.get("api_calls", {}).values()), sum(stage["api_calls"].values())
+        if new_calls > old_calls:
+            regressions.append({"stage": name, "metric": "api_calls", "baseline": old_calls, "current": new_calls})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay benchmark for the assistant pipelines.")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; wall time is the median")
+    parser.add_argument("--stage", action="append", help="only run these stages (repeatable)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated seconds per Groq call")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative growth before flagging")
+    args = parser.parse_args()
+
+    install_stand_ins(args.llm_latency)
+    stages = build_stages()
+    selected = args.stage or list(stages)
+    unknown = [s for s in selected if s not in stages]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}; choose from {', '.join(stages)}")
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "repeat": args.repeat,
+        "llm_latency_s": args.llm_latency,
+        "stages": {name: summarize_runs([run_stage(stages[name]) for _ in range(args.repeat)]) for name in selected},
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+        status = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
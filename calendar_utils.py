@@ -7,57 +7,46 @@ from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
 from dateutil import parser
 import streamlit as st
-import psycopg2
 from auth_utils import authenticate_google
-from eval_utils import g_eval, if_eval, halu_eval, truthful_qa_eval
+import queries
+from table_cache import tasks_cache
+import retrieval
+from eval_queue import eval_queue
+from tracing import span, traced
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
-DB_CONFIG = {
-    "host": "vijayrag.c9uac2i2ihy2.us-east-1.rds.amazonaws.com",
-    "port": 5432,
-    "user": "vijay_admin",
-    "password": "vijay_secure_password_2025",
-    "database": "mydatabase"
-}
-
 def get_calendar_service():
     creds = authenticate_google()
     if not creds:
         raise RuntimeError("❌ Google authentication failed.")
     return build('calendar', 'v3', credentials=creds)
 
-def connect_to_db():
+@traced("db.fetch_task_embeddings", "db")
+def fetch_task_embeddings():
     try:
-        return psycopg2.connect(**DB_CONFIG)
+        return tasks_cache.frame().sort_values(by='due_datetime')
     except Exception as e:
         print("❌ DB Error:", e)
-        return None
-
-def fetch_task_embeddings():
-    conn = connect_to_db()
-    if not conn:
-        return pd.DataFrame()
-    df = pd.read_sql("SELECT * FROM tasks_embeddings_shikha_20250326;", conn)
-    df['due_datetime'] = pd.to_datetime(df['due_date'] + ' ' + df['due_time'])
-    return df
+        return pd.DataFrame(columns=['id', 'title', 'task_type', 'due_date', 'due_time']).assign(
+            due_datetime=pd.Series(dtype="datetime64[ns]"))
 
 def get_task_df():
-    df = fetch_task_embeddings()
-    return df[['id', 'title', 'task_type', 'due_date', 'due_time', 'due_datetime']].sort_values(by='due_datetime')
+    return fetch_task_embeddings()
 
 def list_events_today(service):
     tz = pytz.timezone('Asia/Kolkata')
     now = datetime.now(tz)
     start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     end = now.replace(hour=23, minute=59, second=59, microsecond=999999)
-    events = service.events().list(
-        calendarId='primary',
-        timeMin=start.isoformat(),
-        timeMax=end.isoformat(),
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
+    with span("calendar.events.list", "google"):
+        events = service.events().list(
+            calendarId='primary',
+            timeMin=start.isoformat(),
+            timeMax=end.isoformat(),
+            singleEvents=True,
+            orderBy='startTime'
+        ).execute()
     return events.get('items', [])
 
 def find_free_slot_today(service, duration_minutes=60):
@@ -90,13 +79,11 @@ def suggest_task_slot_today(title: str, duration_minutes: int = 30):
             'start': {'dateTime': start.isoformat(), 'timeZone': 'Asia/Kolkata'},
             'end': {'dateTime': end.isoformat(), 'timeZone': 'Asia/Kolkata'}
         }
-        service.events().insert(calendarId='primary', body=event).execute()
+        with span("calendar.events.insert", "google"):
+            service.events().insert(calendarId='primary', body=event).execute()
 
-        st.markdown("### 📊 Evaluation Metrics")
-        st.code(g_eval(slot_text, reference=title))
-        st.code(if_eval(slot_text, source=title))
-        st.code(truthful_qa_eval(slot_text))
-        st.code(halu_eval(slot_text, input_struct))
+        # Metrics are scored in the background; the page picks them up from the eval store
+        st.session_state.calendar_eval_id = eval_queue.submit(slot_text, title, input_struct, label="calendar_slot")
 
         return f"✅ '{title}' scheduled at {start.strftime('%I:%M %p')} - {end.strftime('%I:%M %p')}"
     else:
@@ -118,13 +105,11 @@ def schedule_doctor_appointment():
             'start': {'dateTime': start.isoformat(), 'timeZone': 'Asia/Kolkata'},
             'end': {'dateTime': end.isoformat(), 'timeZone': 'Asia/Kolkata'}
         }
-        created = service.events().insert(calendarId='primary', body=event).execute()
+        with span("calendar.events.insert", "google"):
+            created = service.events().insert(calendarId='primary', body=event).execute()
 
-        st.markdown("### 📊 Evaluation Metrics")
-        st.code(g_eval(slot_text, reference="Doctor Appointment"))
-        st.code(if_eval(slot_text, source="Doctor Appointment"))
-        st.code(truthful_qa_eval(slot_text))
-        st.code(halu_eval(slot_text, input_struct))
+        # Metrics are scored in the background; the page picks them up from the eval store
+        st.session_state.calendar_eval_id = eval_queue.submit(slot_text, "Doctor Appointment", input_struct, label="calendar_slot")
 
         return start, end, f"✅ Appointment scheduled from {start.strftime('%I:%M %p')} to {end.strftime('%I:%M %p')}"
     else:
@@ -132,33 +117,36 @@ def schedule_doctor_appointment():
 
 def delete_last_task_today():
     df = fetch_task_embeddings()
-    today = datetime.now().date()
-    today_tasks = df[df['due_datetime'].dt.date == today]
+    today_tasks = df[df['due_datetime'].dt.date == datetime.now().date()]
     if today_tasks.empty:
         return "⚠️ No task found for today."
-    last_task_id = today_tasks.sort_values(by='due_datetime').iloc[-1]['id']
-    conn = connect_to_db()
-    cur = conn.cursor()
-    cur.execute(f"DELETE FROM tasks_embeddings_shikha_20250326 WHERE id = {int(last_task_id)};")
-    conn.commit()
+    last_task_id = today_tasks.iloc[-1]['id']
+    queries.delete_tasks([last_task_id])
+    tasks_cache.forget([last_task_id])
+    retrieval.forget("tasks", [last_task_id])
     return f"🗑️ Task ID {int(last_task_id)} deleted."
 
 def delete_tasks_by_date(target_date):
-    df = fetch_task_embeddings()
-    delete_targets = df[df['due_datetime'].dt.date == target_date.date()]
-    if delete_targets.empty:
+    ids = queries.delete_tasks_on(target_date)
+    tasks_cache.forget(ids)
+    retrieval.forget("tasks", ids)
+    if not ids:
         return "❌ No tasks found for the specified date."
-    conn = connect_to_db()
-    cur = conn.cursor()
-    ids = delete_targets['id'].tolist()
-    cur.execute(f"DELETE FROM tasks_embeddings_shikha_20250326 WHERE id = ANY(%s);", (ids,))
-    conn.commit()
     return f"🗑️ Deleted {len(ids)} tasks scheduled on {target_date.strftime('%Y-%m-%d')}"
 
 def show_tasks_by_month(month: str):
-    df = fetch_task_embeddings()
-    month_filtered = df[df['due_datetime'].dt.strftime('%Y-%m') == month]
-    if month_filtered.empty:
+    try:
+        datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        return "❌ Month must be in YYYY-MM format."
+    try:
+        if not tasks_cache.loaded():
+            month_tasks = queries.tasks_for_month(month)
+        else:
+            df = fetch_task_embeddings()
+            month_tasks = df[df['due_datetime'].dt.strftime('%Y-%m') == month]
+    except Exception as e:
+        return f"❌ DB Error: {e}"
+    if month_tasks.empty:
         return "❌ No tasks found for that month."
-    calendar_view = month_filtered[['due_datetime', 'title', 'task_type']].sort_values(by='due_datetime')
-    return calendar_view
+    return month_tasks[['due_datetime', 'title', 'task_type']]
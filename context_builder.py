@@ -0,0 +1,149 @@
+# context_builder.py
+# Packs prompt context into a token budget. Text is split into chunks, each
+# chunk is scored on relevance to the question and on recency, near-identical
+# chunks are dropped, and the best ones are added until the budget for the
+# model is spent. Replaces the fixed [:15000] / [:4000] character slices.
+import hashlib
+import math
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional
+import pandas as pd
+import streamlit as st
+from tracing import span
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+CONTEXT_SETTINGS = st.secrets.get("context", {})
+# Tokens of context per prompt. Groq's free tier allows 6000 tokens a minute, so
+# the default leaves room for the question, the answer and a second request.
+DEFAULT_BUDGET = int(CONTEXT_SETTINGS.get("default_budget", 3000))
+MODEL_BUDGETS = {
+    "llama-3.3-70b-specdec": 3000,
+    "llama-3.3-70b-versatile": 6000,
+    "llama-3.1-8b-instant": 6000,
+    **{k: int(v) for k, v in CONTEXT_SETTINGS.get("budgets", {}).items()},
+}
+# Score = relevance + RECENCY_WEIGHT * 0.5 ** (age / half-life).
+RECENCY_WEIGHT = float(CONTEXT_SETTINGS.get("recency_weight", 0.3))
+RECENCY_HALF_LIFE_DAYS = float(CONTEXT_SETTINGS.get("recency_half_life_days", 30))
+CHUNK_TOKENS = int(CONTEXT_SETTINGS.get("chunk_tokens", 200))
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "for", "from", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "the", "to", "was", "what", "when", "where", "which",
+    "who", "why", "with", "you",
+}
+
+@dataclass
+class Chunk:
+    text: str
+    relevance: float = 0.0
+    timestamp: Optional[datetime] = None
+
+def count_tokens(text: str) -> int:
+    # tiktoken when installed; otherwise the same 4-characters-per-token rule the scheduler uses.
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+def budget_for(model: Optional[str] = None) -> int:
+    return MODEL_BUDGETS.get(model, DEFAULT_BUDGET) if model else DEFAULT_BUDGET
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    if count_tokens(text) <= tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:tokens])
+    return text[:tokens * 4]
+
+def split_text(text: str, max_tokens: int = CHUNK_TOKENS, timestamp=None, relevance: float = 0.0) -> list:
+    # Groups consecutive lines into chunks of at most max_tokens; an overlong line is cut.
+    chunks, lines, size = [], [], 0
+    for line in (l.strip() for l in text.splitlines()):
+        if not line:
+            continue
+        line = truncate_tokens(line, max_tokens)
+        tokens = count_tokens(line)
+        if lines and size + tokens > max_tokens:
+            chunks.append("\n".join(lines))
+            lines, size = [], 0
+        lines.append(line)
+        size += tokens
+    if lines:
+        chunks.append("\n".join(lines))
+    return [Chunk(c, relevance, timestamp) for c in chunks]
+
+def _terms(text: str) -> set:
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS}
+
+def lexical_relevance(query: str, text: str) -> float:
+    # Share of the question's terms that appear in the chunk; used when there are no embedding scores.
+    terms = _terms(query)
+    return len(terms & _terms(text)) / len(terms) if terms else 0.0
+
+def _recency(timestamp, now: datetime) -> float:
+    timestamp = pd.to_datetime(timestamp, errors="coerce")
+    if timestamp is None or pd.isna(timestamp):
+        return 0.0
+    age_days = max((now - timestamp.tz_localize(None).to_pydatetime()).total_seconds(), 0) / 86400
+    return 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha1(" ".join(_WORD.findall(text.lower())).encode()).hexdigest()
+
+def pack(chunks: Iterable[Chunk], budget: Optional[int] = None, query: Optional[str] = None,
+         recency_weight: float = RECENCY_WEIGHT, order: str = "score", separator: str = "\n\n") -> str:
+    # Greedy fill: highest score first, skipping chunks that no longer fit so a
+    # smaller one further down can still use the space. order="original" puts
+    # the chosen chunks back in their input order (for pages and transcripts).
+    budget = budget or DEFAULT_BUDGET
+    now = datetime.now()
+    with span("context.pack", "internal", budget=budget) as s:
+        seen, candidates = set(), []
+        for chunk in chunks:
+            fingerprint = _fingerprint(chunk.text)
+            if not chunk.text.strip() or fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            relevance = chunk.relevance or (lexical_relevance(query, chunk.text) if query else 0.0)
+            score = relevance + recency_weight * _recency(chunk.timestamp, now)
+            candidates.append((score, len(candidates), chunk))
+
+        separator_tokens = count_tokens(separator)
+        chosen, used = [], 0
+        for score, index, chunk in sorted(candidates, key=lambda c: (-c[0], c[1])):
+            tokens = count_tokens(chunk.text) + (separator_tokens if chosen else 0)
+            if used + tokens > budget:
+                continue
+            chosen.append((index, chunk))
+            used += tokens
+        if order == "original":
+            chosen.sort(key=lambda c: c[0])
+        s.set(candidates=len(candidates), chunks=len(chosen), tokens=used)
+        return separator.join(chunk.text for _, chunk in chosen)
+
+def pack_text(text: str, query: Optional[str] = None, budget: Optional[int] = None) -> str:
+    # One document (a web page, search results): keep the relevant chunks in reading order.
+    return pack(split_text(text), budget, query, recency_weight=0.0, order="original")
+
+def pack_rows(df: pd.DataFrame, columns: list, query: Optional[str] = None, budget: Optional[int] = None,
+              relevance_column: Optional[str] = None, time_column: Optional[str] = None,
+              order: str = "score") -> str:
+    # One chunk per row, "column: value | ...", scored from relevance_column
+    # (e.g. 1 - distance) or lexically against query, plus the row's age.
+    chunks = []
+    for row in df.to_dict("records"):
+        text = " | ".join(f"{c}: {row[c]}" for c in columns if c in row)
+        relevance = float(row[relevance_column]) if relevance_column else 0.0
+        timestamp = row.get(time_column) if time_column else None
+        chunks.append(Chunk(text, relevance, timestamp))
+    return pack(chunks, budget, query, order=order, separator="\n")
@@ -0,0 +1,164 @@
+# db.py
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+import pandas as pd
+import psycopg2
+from psycopg2 import pool
+import streamlit as st
+from tracing import span
+
+DB_SETTINGS = st.secrets.get("postgres", {})
+DB_CONFIG = {
+    "host": DB_SETTINGS.get("host", "vijayrag.c9uac2i2ihy2.us-east-1.rds.amazonaws.com"),
+    "port": int(DB_SETTINGS.get("port", 5432)),
+    "user": DB_SETTINGS.get("user", "vijay_admin"),
+    "password": DB_SETTINGS.get("password", "vijay_secure_password_2025"),
+    "database": DB_SETTINGS.get("database", "mydatabase"),
+}
+MIN_CONNECTIONS = int(DB_SETTINGS.get("min_connections", 1))
+MAX_CONNECTIONS = int(DB_SETTINGS.get("max_connections", 5))
+CONNECT_TIMEOUT = int(DB_SETTINGS.get("connect_timeout", 10))
+STATEMENT_TIMEOUT_MS = int(DB_SETTINGS.get("statement_timeout_ms", 15000))
+CHECKOUT_TIMEOUT = float(DB_SETTINGS.get("checkout_timeout", 30))
+# Connections idle for longer than this are pinged before being handed out.
+HEALTH_CHECK_AFTER = 30
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead.
+_slots = threading.BoundedSemaphore(MAX_CONNECTIONS)
+_last_used = {}
+# Idempotent statements (CREATE INDEX IF NOT EXISTS ...) run once per process, when the pool is created.
+_setup_statements = []
+
+def register_setup(statements: list):
+    with _pool_lock:
+        _setup_statements.extend(statements)
+        if _pool is not None:
+            _run_setup(_pool, statements)
+
+def _run_setup(p, statements: list):
+    if not statements:
+        return
+    conn = p.getconn()
+    try:
+        with span("db.setup", "db", statements=len(statements)), conn.cursor() as cur:
+            for statement in statements:
+                cur.execute(statement)
+        conn.commit()
+    except psycopg2.Error as e:
+        # e.g. no CREATE privilege: the app still works, only without the indexes.
+        conn.rollback()
+        print(f"⚠️ Database setup failed: {e}")
+    finally:
+        p.putconn(conn)
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                new_pool = pool.ThreadedConnectionPool(
+                    MIN_CONNECTIONS, MAX_CONNECTIONS,
+                    connect_timeout=CONNECT_TIMEOUT,
+                    options=f"-c statement_timeout={STATEMENT_TIMEOUT_MS}",
+                    keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3,
+                    application_name="personalized-ai-assistant",
+                    **DB_CONFIG,
+                )
+                _run_setup(new_pool, _setup_statements)
+                _pool = new_pool
+    return _pool
+
+def _healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.time() - last_used < HEALTH_CHECK_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _checkout():
+    p = get_pool()
+    # One retry: a stale connection is discarded and replaced with a fresh one.
+    for _ in range(2):
+        conn = p.getconn()
+        if _healthy(conn):
+            return conn
+        _last_used.pop(id(conn), None)
+        p.putconn(conn, close=True)
+    return p.getconn()
+
+@contextmanager
+def connection():
+    # Borrow a pooled connection; it goes back to the pool (rolled back if a
+    # transaction is still open) when the block exits.
+    with span("db.checkout", "db"):
+        if not _slots.acquire(timeout=CHECKOUT_TIMEOUT):
+            raise RuntimeError("❌ Timed out waiting for a database connection.")
+        try:
+            conn = _checkout()
+        except BaseException:
+            _slots.release()
+            raise
+    broken = False
+    try:
+        yield conn
+    except psycopg2.InterfaceError:
+        broken = True
+        raise
+    finally:
+        try:
+            if not conn.closed and not broken:
+                conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        _last_used[id(conn)] = time.time()
+        if broken or conn.closed:
+            _last_used.pop(id(conn), None)
+        get_pool().putconn(conn, close=broken or bool(conn.closed))
+        _slots.release()
+
+@contextmanager
+def cursor(commit: bool = False):
+    # Cursor on a pooled connection; commits on success when commit=True, else rolls back.
+    with connection() as conn:
+        with conn.cursor() as cur:
+            yield cur
+        if commit:
+            conn.commit()
+
+def read_sql(query: str, params: Optional[tuple] = None) -> pd.DataFrame:
+    with connection() as conn:
+        with span("db.read_sql", "db"):
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                columns = [c.name for c in cur.description]
+                rows = cur.fetchall()
+    return pd.DataFrame(rows, columns=columns)
+
+def execute(query: str, params: Optional[tuple] = None) -> int:
+    with cursor(commit=True) as cur:
+        with span("db.execute", "db"):
+            cur.execute(query, params)
+            return cur.rowcount
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+
+# Close the pooled connections when the server process exits instead of leaving RDS to time them out.
+atexit.register(close_pool)
@@ -0,0 +1,115 @@
+# email_triage.py
+# Inbox triage: summarize and classify many emails at once. Messages come from
+# the local inbox mirror (or a Gmail query fetched in batch requests), are
+# grouped into threads so each thread costs one LLM call, and the calls run
+# concurrently under MAX_WORKERS. triage() yields rows as they finish.
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from typing import Optional
+import streamlit as st
+import context_builder
+import gmail_sync
+import gmail_utils
+from llm_client import complete
+from tracing import span, bind
+
+TRIAGE_SETTINGS = st.secrets.get("email_triage", {})
+MAX_WORKERS = int(TRIAGE_SETTINGS.get("max_workers", 6))
+# Tokens of thread text per call; the newest messages are kept when a thread is longer.
+THREAD_TOKENS = int(TRIAGE_SETTINGS.get("thread_tokens", 1500))
+CATEGORIES = ["Action required", "Reply needed", "Meeting", "FYI", "Newsletter", "Promotion"]
+PRIORITIES = ["high", "medium", "low"]
+
+@dataclass
+class TriageRow:
+    thread_id: str
+    sender: str
+    subject: str
+    date: str
+    messages: int
+    priority: str = ""
+    category: str = ""
+    summary: str = ""
+    error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+def load_emails(limit: int = 50, query: Optional[str] = None) -> list:
+    # The inbox mirror covers the default view up to its size; a custom query, or
+    # more mail than the mirror holds, is one list plus batched gets.
+    if not query and limit <= gmail_sync.BOOTSTRAP_COUNT:
+        return gmail_utils.inbox.messages(limit)
+    query = query or gmail_sync.QUERY
+    with span("gmail.triage_query", "google"):
+        service = gmail_utils.get_gmail_service()
+        listed = service.users().messages().list(userId="me", maxResults=limit, q=query).execute()
+        ids = [m["id"] for m in listed.get("messages", [])]
+        return [gmail_utils.parse_message(raw, service) for raw in gmail_utils.inbox.fetch_batch(service, ids)]
+
+def group_threads(emails: list) -> list:
+    # One list per thread, oldest message first; threads with the newest activity first.
+    threads = {}
+    for email in emails:
+        threads.setdefault(email.get("thread_id") or email["id"], []).append(email)
+    for messages in threads.values():
+        messages.sort(key=lambda m: m["internal_date"])
+    return sorted(threads.values(), key=lambda t: t[-1]["internal_date"], reverse=True)
+
+def thread_text(thread: list, budget: int = THREAD_TOKENS) -> str:
+    kept, used = [], 0
+    for email in reversed(thread):
+        block = f"From: {email['sender']}\nDate: {email['date']}\n\n{email['body']}"
+        tokens = context_builder.count_tokens(block)
+        if kept and used + tokens > budget:
+            break
+        kept.append(context_builder.truncate_tokens(block, budget - used))
+        used += min(tokens, budget - used)
+    return "\n\n---\n\n".join(reversed(kept))
+
+def triage_prompt(thread: list) -> str:
+    return (
+        f"Summarize the following email thread and classify it.\n\n"
+        f"Subject: {thread[-1]['subject']}\n\n{thread_text(thread)}\n\n"
+        f"Respond with only a JSON object, no prose:\n"
+        f'{{"summary": "<two sentences at most>", "category": "<one of: {", ".join(CATEGORIES)}>", '
+        f'"priority": "<one of: {", ".join(PRIORITIES)}>"}}'
+    )
+
+def parse_triage(text: str) -> dict:
+    # Lenient: a reply that isn't the expected JSON still yields its text as the summary.
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    try:
+        data = json.loads(match.group(0)) if match else {}
+    except ValueError:
+        data = {}
+    category = next((c for c in CATEGORIES if c.lower() == str(data.get("category", "")).lower()), "Unclassified")
+    priority = str(data.get("priority", "")).lower()
+    return {
+        "summary": str(data.get("summary") or text).strip(),
+        "category": category,
+        "priority": priority if priority in PRIORITIES else "medium",
+    }
+
+def triage_thread(thread: list) -> TriageRow:
+    latest = thread[-1]
+    row = TriageRow(latest.get("thread_id") or latest["id"], latest["sender"], latest["subject"],
+                    latest["date"], len(thread))
+    result = complete(triage_prompt(thread))
+    if result.error:
+        row.error = result.error
+        return row
+    parsed = parse_triage(result.text)
+    row.summary, row.category, row.priority = parsed["summary"], parsed["category"], parsed["priority"]
+    return row
+
+def triage(emails: list, max_workers: int = MAX_WORKERS):
+    # Yields a TriageRow per thread in completion order.
+    threads = group_threads(emails)
+    with span("email.triage", "internal", emails=len(emails), threads=len(threads)):
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(bind(lambda thread=thread: triage_thread(thread))) for thread in threads]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,99 @@
+# eval_queue.py
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import streamlit as st
+from eval_utils import evaluate_all, EvalResult
+from eval_store import EvalStore, eval_store
+from tracing import span
+
+MAX_WORKERS = int(st.secrets.get("eval", {}).get("workers", 4))
+
+def response_id(label: str, output: str, reference: str = "") -> str:
+    # Deterministic, so a Streamlit rerun that regenerates the same answer finds its earlier job.
+    payload = json.dumps([label, output, reference], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def generation_meta(generation) -> dict:
+    # Pulls model, latency and token usage off an LLMResult or a finished LLMStream.
+    if generation is None:
+        return {}
+    messages = getattr(generation, "messages", None)
+    prompt_hash = None
+    if messages:
+        prompt_hash = hashlib.sha256(json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+    return {
+        "model": getattr(generation, "model", None),
+        "prompt_hash": prompt_hash,
+        "gen_latency": getattr(generation, "latency", None),
+        "prompt_tokens": getattr(generation, "prompt_tokens", None),
+        "completion_tokens": getattr(generation, "completion_tokens", None),
+    }
+
+class EvalQueue:
+    # Runs judge calls on a small worker pool so the caller returns as soon as the
+    # generation is done. Results are written to the store; poll with status().
+    def __init__(self, store: EvalStore, max_workers=MAX_WORKERS):
+        self.store = store
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="eval-queue")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, output: str, reference: str, input_struct: Optional[dict] = None, label: str = "",
+               generation=None) -> str:
+        return self.submit_job(label, lambda: evaluate_all(output, reference, input_struct), output, reference, generation)
+
+    def submit_job(self, label: str, job: Callable, output: str = "", reference: str = "", generation=None) -> str:
+        # job returns an EvalResult or a {metric: score} dict. Resubmitting a
+        # response that is queued or already scored is a no-op.
+        rid = response_id(label, output, reference)
+        with self._lock:
+            if rid in self._pending:
+                return rid
+            known = self.store.get(rid)
+            if known and known["status"] == "done":
+                return rid
+            record = {
+                "response_id": rid, "feature": label, "status": "pending",
+                "output": output, "reference": reference, "created_at": time.time(),
+                **generation_meta(generation),
+            }
+            self.store.put(record)
+            self._pending[rid] = self._pool.submit(self._run, record, job)
+        return rid
+
+    def _run(self, record: dict, job: Callable):
+        rid = record["response_id"]
+        start = time.time()
+        try:
+            with span(f"eval_queue.{record['feature'] or 'job'}", "eval", response_id=rid):
+                result = job()
+            scores = result.as_dict() if isinstance(result, EvalResult) else dict(result)
+            # Judges report errors (rate limits, timeouts) as "❌ ..." scores rather than
+            # raising; keep those as failed so a resubmit scores the response again.
+            failures = [str(v) for v in scores.values() if str(v).startswith("❌")]
+            self.store.put({**record, "status": "failed" if failures else "done", "scores": scores,
+                            "error": "; ".join(failures) or None,
+                            "eval_latency": round(time.time() - start, 2), "finished_at": time.time()})
+        except Exception as e:
+            print(f"❌ Background evaluation {rid} failed: {e}")
+            self.store.put({**record, "status": "failed", "error": str(e),
+                            "eval_latency": round(time.time() - start, 2), "finished_at": time.time()})
+        finally:
+            with self._lock:
+                self._pending.pop(rid, None)
+
+    def status(self, rid: str) -> Optional[dict]:
+        return self.store.get(rid)
+
+    def drain(self, timeout: Optional[float] = None):
+        # Blocks until every queued job has finished; used by the offline benchmarks.
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            future.result(timeout=timeout)
+
+eval_queue = EvalQueue(eval_store)
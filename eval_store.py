@@ -0,0 +1,219 @@
+# eval_store.py
+import json
+import re
+import sqlite3
+import threading
+from typing import Optional
+import pandas as pd
+import streamlit as st
+
+EVAL_SETTINGS = st.secrets.get("eval", {})
+RESULTS_PATH = EVAL_SETTINGS.get("results_path", ".eval_results.sqlite")
+POSTGRES_DSN = EVAL_SETTINGS.get("postgres_dsn")
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 2.0
+
+SCORE_COLUMNS = ["g_eval", "if_eval", "truthful_qa", "halu_eval"]
+COLUMNS = [
+    "response_id", "feature", "status", "model", "prompt_hash", "output", "reference", "scores", "error",
+    *SCORE_COLUMNS,
+    "gen_latency", "eval_latency", "prompt_tokens", "completion_tokens", "created_at", "finished_at",
+]
+_REAL_COLUMNS = set(SCORE_COLUMNS) | {"gen_latency", "eval_latency", "created_at", "finished_at"}
+_INT_COLUMNS = {"prompt_tokens", "completion_tokens"}
+
+def parse_score(text) -> Optional[float]:
+    # "G-Eval: 7/10" -> 7.0, "HALUeval: 1" -> 1.0; failed judges ("❌ ...") -> None.
+    if text is None or str(text).startswith("❌"):
+        return None
+    match = re.search(r":\s*(\d+(?:\.\d+)?)", str(text))
+    return float(match.group(1)) if match else None
+
+def column_type(name: str, real: str, integer: str, text: str) -> str:
+    if name in _REAL_COLUMNS:
+        return real
+    if name in _INT_COLUMNS:
+        return integer
+    return text
+
+class SQLiteBackend:
+    placeholder = "?"
+
+    def __init__(self, path=RESULTS_PATH):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        columns = ", ".join(
+            f"{c} {column_type(c, 'REAL', 'INTEGER', 'TEXT')}" + (" PRIMARY KEY" if c == "response_id" else "")
+            for c in COLUMNS
+        )
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS eval_records ({columns})")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS eval_records_feature ON eval_records (feature, created_at)")
+        self.conn.commit()
+
+    def upsert_many(self, rows: list):
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        self.conn.executemany(f"INSERT OR REPLACE INTO eval_records ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+        self.conn.commit()
+
+    def query(self, sql: str, args=()) -> list:
+        return self.conn.execute(sql, args).fetchall()
+
+class PostgresBackend:
+    placeholder = "%s"
+
+    def __init__(self, dsn: str):
+        import psycopg2
+        self.conn = psycopg2.connect(dsn)
+        columns = ", ".join(
+            f"{c} {column_type(c, 'DOUBLE PRECISION', 'INTEGER', 'TEXT')}" + (" PRIMARY KEY" if c == "response_id" else "")
+            for c in COLUMNS
+        )
+        with self.conn.cursor() as cur:
+            cur.execute(f"CREATE TABLE IF NOT EXISTS eval_records ({columns})")
+            cur.execute("CREATE INDEX IF NOT EXISTS eval_records_feature ON eval_records (feature, created_at)")
+        self.conn.commit()
+
+    def upsert_many(self, rows: list):
+        placeholders = ", ".join("%s" for _ in COLUMNS)
+        updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in COLUMNS if c != "response_id")
+        with self.conn.cursor() as cur:
+            cur.executemany(
+                f"INSERT INTO eval_records ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+                f"ON CONFLICT (response_id) DO UPDATE SET {updates}",
+                rows,
+            )
+        self.conn.commit()
+
+    def query(self, sql: str, args=()) -> list:
+        with self.conn.cursor() as cur:
+            cur.execute(sql, args)
+            return cur.fetchall()
+
+class EvalStore:
+    # put() only buffers the record; a writer thread appends buffered rows in
+    # batches, so recording a result never waits on the database. Unflushed
+    # records are still visible to get().
+    def __init__(self, backend=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self._backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = PostgresBackend(POSTGRES_DSN) if POSTGRES_DSN else SQLiteBackend()
+        return self._backend
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="eval-store-writer", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Eval store flush failed: {e}")
+
+    def put(self, record: dict):
+        row = {c: record.get(c) for c in COLUMNS}
+        if isinstance(row["scores"], dict):
+            for key in SCORE_COLUMNS:
+                row[key] = parse_score(row["scores"].get(key))
+            row["scores"] = json.dumps(row["scores"], ensure_ascii=False)
+        with self._lock:
+            self._buffer[row["response_id"]] = row
+            full = len(self._buffer) >= self.batch_size
+            self._start_writer()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            pending = list(self._buffer.values())
+        if not pending:
+            return
+        with self._db_lock:
+            self.backend.upsert_many([tuple(row[c] for c in COLUMNS) for row in pending])
+        with self._lock:
+            for row in pending:
+                # Only drop a buffered row if it hasn't been replaced while we were writing.
+                if self._buffer.get(row["response_id"]) is row:
+                    del self._buffer[row["response_id"]]
+
+    def _decode(self, row: dict) -> dict:
+        record = dict(row)
+        if isinstance(record.get("scores"), str):
+            record["scores"] = json.loads(record["scores"])
+        return record
+
+    def _select(self, where: str = "", args=(), limit: Optional[int] = None) -> list:
+        p = self.backend.placeholder
+        sql = f"SELECT {', '.join(COLUMNS)} FROM eval_records"
+        if where:
+            sql += " WHERE " + where.replace("?", p)
+        sql += " ORDER BY created_at DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._db_lock:
+            rows = self.backend.query(sql, args)
+        return [dict(zip(COLUMNS, r)) for r in rows]
+
+    def get(self, response_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._buffer.get(response_id)
+        if row is None:
+            rows = self._select("response_id = ?", (response_id,))
+            row = rows[0] if rows else None
+        return self._decode(row) if row else None
+
+    def recent(self, feature: Optional[str] = None, limit: int = 50) -> list:
+        self.flush()
+        rows = self._select("feature = ?", (feature,), limit) if feature else self._select(limit=limit)
+        return [self._decode(r) for r in rows]
+
+    def frame(self, feature: Optional[str] = None, since: Optional[float] = None) -> pd.DataFrame:
+        self.flush()
+        clauses, args = ["status = ?"], ["done"]
+        if feature:
+            clauses.append("feature = ?")
+            args.append(feature)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            args.append(since)
+        return pd.DataFrame(self._select(" AND ".join(clauses), tuple(args)), columns=COLUMNS)
+
+    def latency_report(self, since: Optional[float] = None) -> pd.DataFrame:
+        df = self.frame(since=since)
+        if df.empty:
+            return pd.DataFrame()
+        grouped = df.groupby("feature")
+        report = pd.DataFrame({
+            "count": grouped.size(),
+            "gen_p50": grouped["gen_latency"].quantile(0.5),
+            "gen_p95": grouped["gen_latency"].quantile(0.95),
+            "eval_p50": grouped["eval_latency"].quantile(0.5),
+            "eval_p95": grouped["eval_latency"].quantile(0.95),
+            "avg_prompt_tokens": grouped["prompt_tokens"].mean(),
+            "avg_completion_tokens": grouped["completion_tokens"].mean(),
+        })
+        return report.round(2)
+
+    def score_distribution(self, feature: Optional[str] = None, since: Optional[float] = None) -> pd.DataFrame:
+        # Per feature and metric: how many responses got each score.
+        df = self.frame(feature, since)
+        if df.empty:
+            return pd.DataFrame()
+        long = df.melt(id_vars=["feature"], value_vars=SCORE_COLUMNS, var_name="metric", value_name="score").dropna()
+        if long.empty:
+            return pd.DataFrame()
+        return long.groupby(["feature", "metric", "score"]).size().unstack("score", fill_value=0)
+
+eval_store = EvalStore()
@@ -1,16 +1,18 @@
 # eval_utils.py
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Optional
 import streamlit as st
-from groq import Groq
+from llm_client import complete
+from llm_scheduler import PRIORITY_BACKGROUND
+from tracing import span, traced, bind
 
-# Setup Groq client
-api_key = st.secrets.get("groq", {}).get("api_key", "")
-if not api_key or not api_key.startswith("gsk_"):
-    st.error("❌ Valid Groq API key not found in Streamlit secrets.")
-    st.stop()
-
-groq_eval = Groq(api_key=api_key)
+# "per_metric" sends one judge call per metric, "combined" asks for all scores in one call
+EVAL_MODE = st.secrets.get("eval", {}).get("mode", "per_metric")
 
 # -------------------- G-Eval -------------------- #
+@traced("eval.g_eval", "eval")
 def g_eval(summary: str, reference: str) -> str:
     prompt = f"""Give only overall G-Eval score out of 10.
 ---
@@ -21,16 +23,13 @@ Reference:
 {reference}
 
 Respond with: G-Eval: <score>/10"""
-    try:
-        response = groq_eval.chat.completions.create(
-            model="llama-3.3-70b-specdec",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"❌ G-Eval failed: {e}"
+    result = complete(prompt, priority=PRIORITY_BACKGROUND)
+    if result.error:
+        return f"❌ G-Eval failed: {result.error}"
+    return result.text
 
 # -------------------- IFEval (Score Only) -------------------- #
+@traced("eval.if_eval", "eval")
 def if_eval(output: str, source: str) -> str:
     prompt = f"""
 Rate factual consistency between the source and generated output on a scale from 1 to 5:
@@ -47,16 +46,13 @@ Generated Output:
 {output}
 
 Respond with: IFEval: <score>/5"""
-    try:
-        response = groq_eval.chat.completions.create(
-            model="llama-3.3-70b-specdec",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"❌ IFEval failed: {e}"
+    result = complete(prompt, priority=PRIORITY_BACKGROUND)
+    if result.error:
+        return f"❌ IFEval failed: {result.error}"
+    return result.text
 
 # -------------------- HALUeval (0/1) -------------------- #
+@traced("eval.halu_eval", "eval")
 def halu_eval(generated_text: str, input_struct: dict) -> str:
     struct_facts = "\n".join([f"{k}: {v}" for k, v in input_struct.items()])
     prompt = f"""Determine if the following output contains hallucinations.
@@ -67,16 +63,13 @@ Generated Text:
 {generated_text}
 
 Respond with: HALUeval: 1 if hallucination present, else HALUeval: 0"""
-    try:
-        response = groq_eval.chat.completions.create(
-            model="llama-3.3-70b-specdec",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"❌ HALUeval failed: {e}"
+    result = complete(prompt, priority=PRIORITY_BACKGROUND)
+    if result.error:
+        return f"❌ HALUeval failed: {result.error}"
+    return result.text
 
 # -------------------- TruthfulQA (Score Only) -------------------- #
+@traced("eval.truthful_qa_eval", "eval")
 def truthful_qa_eval(output: str) -> str:
     prompt = f"""Rate factual correctness of this response from 1 to 5:
 - 5 = Fully accurate
@@ -89,16 +82,13 @@ Response:
 {output}
 
 Respond with: TruthfulQA: <score>/5"""
-    try:
-        response = groq_eval.chat.completions.create(
-            model="llama-3.3-70b-specdec",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"❌ TruthfulQA eval failed: {e}"
+    result = complete(prompt, priority=PRIORITY_BACKGROUND)
+    if result.error:
+        return f"❌ TruthfulQA eval failed: {result.error}"
+    return result.text
 
 # -------------------- Q2 Eval (Structured JSON) -------------------- #
+@traced("eval.q2_eval", "eval")
 def q2_eval(summary: str, reference: str) -> str:
     prompt = f"""
 You are a QA evaluator.
@@ -119,11 +109,121 @@ Respond with JSON:
   "explanation": "Brief explanation in one sentence"
 }}
 """
-    try:
-        response = groq_eval.chat.completions.create(
-            model="llama-3.3-70b-specdec",
-            messages=[{"role": "user", "content": prompt}]
+    result = complete(prompt, priority=PRIORITY_BACKGROUND)
+    if result.error:
+        return f"❌ Q2 Eval failed: {result.error}"
+    return result.text
+
+# -------------------- Batched Evaluation -------------------- #
+@dataclass
+class EvalResult:
+    g_eval: str
+    if_eval: str
+    truthful_qa: str
+    halu_eval: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+    def __str__(self) -> str:
+        return "\n".join(self.as_dict().values())
+
+_eval_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="eval")
+
+def evaluate_all(output: str, reference: str, input_struct: Optional[dict] = None, mode: Optional[str] = None) -> EvalResult:
+    mode = mode or EVAL_MODE
+    with span("eval.evaluate_all", "eval", mode=mode):
+        if mode == "combined":
+            return combined_eval(output, reference, input_struct)
+        return evaluate_per_metric(output, reference, input_struct)
+
+def evaluate_per_metric(output: str, reference: str, input_struct: Optional[dict] = None) -> EvalResult:
+    # Fire all judge calls at once; total time is the slowest call, not the sum.
+    # HALUeval is skipped when no structured input is given.
+    g_future = _eval_pool.submit(bind(g_eval), output, reference)
+    if_future = _eval_pool.submit(bind(if_eval), output, reference)
+    truth_future = _eval_pool.submit(bind(truthful_qa_eval), output)
+    halu_future = _eval_pool.submit(bind(halu_eval), output, input_struct) if input_struct is not None else None
+    return EvalResult(
+        g_eval=g_future.result(),
+        if_eval=if_future.result(),
+        truthful_qa=truth_future.result(),
+        halu_eval=halu_future.result() if halu_future else None,
+    )
+
+# -------------------- Combined Judge (Single Call) -------------------- #
+def build_combined_prompt(output: str, reference: str, input_struct: Optional[dict] = None) -> str:
+    # The source text is sent once; structured fields that repeat it are referenced, not resent.
+    halu_block = ""
+    halu_key = ""
+    if input_struct is not None:
+        struct_facts = "\n".join(
+            f"{k}: (same as Reference)" if str(v) == reference else f"{k}: {v}"
+            for k, v in input_struct.items()
         )
-        return response.choices[0].message.content.strip()
+        halu_block = f"""
+- "halu_eval": 1 if the Generated Output contains hallucinations with respect to the Structured Input, else 0
+
+Structured Input:
+{struct_facts}
+"""
+        halu_key = ', "halu_eval": <0 or 1>'
+    return f"""You are an evaluator. Score the Generated Output against the Reference on these metrics:
+- "g_eval": overall G-Eval quality score, integer 0-10
+- "if_eval": factual consistency with the Reference, integer 1-5 (5 = completely correct, 1 = largely incorrect)
+- "truthful_qa": factual correctness of the output on its own, integer 1-5 (5 = fully accurate, 1 = completely false)
+{halu_block}
+Reference:
+{reference}
+
+Generated Output:
+{output}
+
+Respond with only a JSON object, no prose:
+{{"g_eval": <int>, "if_eval": <int>, "truthful_qa": <int>{halu_key}}}"""
+
+_COMBINED_RANGES = {"g_eval": (0, 10), "if_eval": (1, 5), "truthful_qa": (1, 5), "halu_eval": (0, 1)}
+
+def parse_combined_scores(text: str, expect_halu: bool) -> dict:
+    # Strict: the JSON object starting at the first "{", every expected key present,
+    # integer scores in range. Text after the object (a trailing note) is ignored.
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("no JSON object in judge response")
+    data, _ = json.JSONDecoder().raw_decode(text, start)
+    if not isinstance(data, dict):
+        raise ValueError("judge response is not a JSON object")
+    keys = ["g_eval", "if_eval", "truthful_qa"] + (["halu_eval"] if expect_halu else [])
+    scores = {}
+    for key in keys:
+        value = data.get(key)
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{key} is missing or not an integer: {value!r}")
+        low, high = _COMBINED_RANGES[key]
+        if not low <= value <= high:
+            raise ValueError(f"{key}={value} outside {low}-{high}")
+        scores[key] = value
+    return scores
+
+def format_combined_scores(scores: dict) -> EvalResult:
+    # Same wording as the per-metric judges so callers can't tell the modes apart.
+    return EvalResult(
+        g_eval=f"G-Eval: {scores['g_eval']}/10",
+        if_eval=f"IFEval: {scores['if_eval']}/5",
+        truthful_qa=f"TruthfulQA: {scores['truthful_qa']}/5",
+        halu_eval=f"HALUeval: {scores['halu_eval']}" if "halu_eval" in scores else None,
+    )
+
+def combined_eval(output: str, reference: str, input_struct: Optional[dict] = None) -> EvalResult:
+    prompt = build_combined_prompt(output, reference, input_struct)
+    # Not cached: a malformed reply would otherwise be replayed on every retry of
+    # this response. The eval queue already skips responses that were scored.
+    result = complete(prompt, use_cache=False, priority=PRIORITY_BACKGROUND)
+    try:
+        if result.error:
+            raise RuntimeError(result.error)
+        scores = parse_combined_scores(result.text, input_struct is not None)
+        return format_combined_scores(scores)
     except Exception as e:
-        return f"❌ Q2 Eval failed: {e}"
\ No newline at end of file
+        print(f"⚠️ Combined eval unusable, falling back to per-metric judges: {e}")
+        return evaluate_per_metric(output, reference, input_struct)
@@ -0,0 +1,238 @@
+# gmail_sync.py
+# Local mirror of the recent inbox. The first sync lists the last N messages
+# and fetches them in Gmail batch requests; after that users.history is read
+# from the stored historyId, so only added or deleted messages cost a
+# request; label changes (read, archived, trashed) are applied from the
+# history entries themselves. Parsed messages live in memory and in a SQLite
+# file, and reads within SYNC_INTERVAL of the last sync don't touch the API.
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+import streamlit as st
+from googleapiclient.errors import HttpError
+from tracing import span
+
+SYNC_SETTINGS = st.secrets.get("gmail_sync", {})
+STORE_PATH = SYNC_SETTINGS.get("path", ".gmail_store.sqlite")
+BOOTSTRAP_COUNT = int(SYNC_SETTINGS.get("bootstrap_count", 50))
+SYNC_INTERVAL = float(SYNC_SETTINGS.get("sync_interval", 30))
+QUERY = SYNC_SETTINGS.get("query", "in:inbox category:primary")
+# history entries can't be matched against QUERY; messages must be in the inbox
+# and carry this label instead.
+REQUIRED_LABEL = SYNC_SETTINGS.get("label", "CATEGORY_PERSONAL")
+EXCLUDED_LABELS = {"TRASH", "SPAM"}
+# Gmail accepts up to 100 calls per batch but recommends 50.
+BATCH_SIZE = 50
+FETCH_RETRIES = int(SYNC_SETTINGS.get("fetch_retries", 2))
+FETCH_BACKOFF = float(SYNC_SETTINGS.get("fetch_backoff_seconds", 1.0))
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Partial response for messages.get: top-level headers plus the part tree, without
+# per-part headers (up to four multipart levels deep, which covers real-world mail).
+_PART = "mimeType,filename,body(data,size,attachmentId)"
+_PARTS = f"parts({_PART},parts({_PART},parts({_PART},parts({_PART}))))"
+MESSAGE_FIELDS = f"id,threadId,internalDate,labelIds,payload(mimeType,headers,body(data,size,attachmentId),{_PARTS})"
+FIELDS = ["id", "thread_id", "internal_date", "sender", "subject", "date", "body", "labels"]
+
+def _status(exception) -> Optional[int]:
+    return getattr(exception, "status_code", None) or getattr(getattr(exception, "resp", None), "status", None)
+
+def _retryable(exception) -> bool:
+    # Throttling, server errors and dropped connections; a 404 (message gone) won't improve.
+    if isinstance(exception, HttpError):
+        return _status(exception) in RETRYABLE_STATUS
+    return isinstance(exception, OSError)
+
+def in_mirror(labels) -> bool:
+    labels = set(labels or [])
+    return REQUIRED_LABEL in labels and "INBOX" in labels and not labels & EXCLUDED_LABELS
+
+class GmailSync:
+    def __init__(self, service_factory: Callable, parse: Callable, path=STORE_PATH):
+        # parse(raw_message, service) -> dict with the FIELDS above.
+        self.service_factory = service_factory
+        self.parse = parse
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = None
+        self._messages = None
+        self._history_id = None
+        self._synced_at = 0.0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id TEXT PRIMARY KEY, internal_date INTEGER NOT NULL, data TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.commit()
+        return self._conn
+
+    def _load_local(self) -> bool:
+        db = self._db()
+        row = db.execute("SELECT value FROM sync_state WHERE key = 'history_id'").fetchone()
+        if not row:
+            return False
+        self._history_id = row[0]
+        self._messages = {
+            message_id: json.loads(data)
+            for message_id, data in db.execute("SELECT id, data FROM messages")
+        }
+        return True
+
+    def _save(self, added: list, deleted: list, history_id: str):
+        # The historyId is stored in the same transaction as the changes it covers,
+        # and only then becomes the starting point of the next sync.
+        db = self._db()
+        if deleted:
+            db.executemany("DELETE FROM messages WHERE id = ?", [(i,) for i in deleted])
+        db.executemany(
+            "INSERT OR REPLACE INTO messages (id, internal_date, data) VALUES (?, ?, ?)",
+            [(m["id"], m["internal_date"], json.dumps(m, ensure_ascii=False)) for m in added],
+        )
+        db.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('history_id', ?)", (history_id,))
+        db.commit()
+        self._history_id = history_id
+
+    def _trim(self):
+        # Keep the newest BOOTSTRAP_COUNT; older mail ages out of the mirror.
+        ordered = sorted(self._messages.values(), key=lambda m: m["internal_date"], reverse=True)
+        dropped = [m["id"] for m in ordered[BOOTSTRAP_COUNT:]]
+        for message_id in dropped:
+            del self._messages[message_id]
+        return dropped
+
+    def fetch_batch(self, service, ids: list, fmt: str = "full", fields: str = MESSAGE_FIELDS,
+                    errors: Optional[dict] = None) -> list:
+        # messages.get for many ids in BATCH_SIZE-call HTTP batches. Throttled or 5xx
+        # gets are retried with exponential backoff; ids that still fail are skipped
+        # and, when errors is given, recorded there as id -> exception.
+        found, failed, retry = {}, {}, []
+
+        def collect(request_id, response, exception):
+            if exception is None:
+                found[request_id] = response
+                failed.pop(request_id, None)
+            else:
+                failed[request_id] = exception
+                if _retryable(exception):
+                    retry.append(request_id)
+
+        pending = list(ids)
+        for attempt in range(FETCH_RETRIES + 1):
+            if attempt:
+                time.sleep(FETCH_BACKOFF * 2 ** (attempt - 1))
+            retry.clear()
+            for start in range(0, len(pending), BATCH_SIZE):
+                batch = service.new_batch_http_request(callback=collect)
+                for message_id in pending[start:start + BATCH_SIZE]:
+                    request = service.users().messages().get(userId="me", id=message_id, format=fmt, fields=fields)
+                    batch.add(request, request_id=message_id)
+                with span("gmail.batch_get", "google", messages=len(pending[start:start + BATCH_SIZE]),
+                          attempt=attempt + 1):
+                    batch.execute()
+            pending = list(retry)
+            if not pending:
+                break
+        for message_id, exception in failed.items():
+            print(f"⚠️ Gmail batch get failed for {message_id}: {exception}")
+        if errors is not None:
+            errors.update(failed)
+        return [found[i] for i in ids if i in found]
+
+    def _bootstrap(self, service):
+        with span("gmail.bootstrap", "google") as s:
+            # Taken before listing, so nothing that arrives mid-bootstrap is missed.
+            history_id = service.users().getProfile(userId="me").execute()["historyId"]
+            listed = service.users().messages().list(userId="me", maxResults=BOOTSTRAP_COUNT, q=QUERY).execute()
+            ids = [m["id"] for m in listed.get("messages", [])]
+            parsed = [self.parse(raw, service) for raw in self.fetch_batch(service, ids)]
+            self._messages = {m["id"]: m for m in parsed}
+            db = self._db()
+            db.execute("DELETE FROM messages")
+            self._save(parsed, [], str(history_id))
+            s.set(messages=len(parsed))
+
+    def _apply_history(self, service):
+        # Replays the changes since the stored historyId; the last state of each
+        # message wins. A message joins the mirror when it arrives in (or is moved
+        # back to) the inbox with REQUIRED_LABEL, and leaves when it is deleted,
+        # trashed, archived or recategorised. If some new messages can't be fetched
+        # even after retries, the mirror is rebuilt rather than skipping them.
+        labels, page_token = {}, None  # message id -> current labelIds, None once deleted
+        with span("gmail.history", "google") as s:
+            while True:
+                response = service.users().history().list(
+                    userId="me", startHistoryId=self._history_id, pageToken=page_token,
+                    historyTypes=["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"],
+                ).execute()
+                for entry in response.get("history", []):
+                    for key in ("messagesAdded", "labelsAdded", "labelsRemoved"):
+                        for item in entry.get(key, []):
+                            message = item["message"]
+                            labels[message["id"]] = message.get("labelIds", [])
+                    for item in entry.get("messagesDeleted", []):
+                        labels[item["message"]["id"]] = None
+                page_token = response.get("nextPageToken")
+                if not page_token:
+                    history_id = str(response.get("historyId", self._history_id))
+                    break
+            removed = [i for i, current in labels.items() if not in_mirror(current) and i in self._messages]
+            relabelled = [i for i, current in labels.items() if in_mirror(current) and i in self._messages]
+            wanted = [i for i, current in labels.items() if in_mirror(current) and i not in self._messages]
+            errors = {}
+            parsed = [self.parse(raw, service) for raw in self.fetch_batch(service, wanted, errors=errors)]
+            # A 404 means the message was deleted after the history entry was written.
+            gone = [i for i, e in errors.items() if _status(e) == 404]
+            if len(gone) < len(errors):
+                print(f"⚠️ {len(errors) - len(gone)} new messages couldn't be fetched, rebuilding the Gmail mirror.")
+                self._bootstrap(service)
+                return
+            for message_id in removed:
+                del self._messages[message_id]
+            for message_id in relabelled:
+                self._messages[message_id] = {**self._messages[message_id], "labels": labels[message_id]}
+            self._messages.update({m["id"]: m for m in parsed})
+            dropped = self._trim()
+            changed = [self._messages[i] for i in relabelled + [m["id"] for m in parsed] if i in self._messages]
+            self._save(changed, removed + dropped, history_id)
+            s.set(added=len(parsed), removed=len(removed), relabelled=len(relabelled))
+
+    def sync(self, force: bool = False):
+        with self._lock:
+            if not force and time.time() - self._synced_at < SYNC_INTERVAL:
+                return
+            if self._messages is None:
+                self._load_local()
+            service = self.service_factory()
+            if self._history_id is None:
+                self._bootstrap(service)
+            else:
+                try:
+                    self._apply_history(service)
+                except HttpError as e:
+                    # 404: the stored historyId is too old for Gmail to replay; start over.
+                    if getattr(e, "status_code", None) == 404 or getattr(e.resp, "status", None) == 404:
+                        self._bootstrap(service)
+                    else:
+                        raise
+            self._synced_at = time.time()
+
+    def messages(self, limit: Optional[int] = None) -> list:
+        # Newest first.
+        self.sync()
+        with self._lock:
+            ordered = sorted(self._messages.values(), key=lambda m: m["internal_date"], reverse=True)
+        return ordered[:limit] if limit else ordered
+
+    def get(self, message_id: str) -> Optional[dict]:
+        self.sync()
+        with self._lock:
+            return self._messages.get(message_id)
+
+    def latest(self) -> Optional[dict]:
+        recent = self.messages(1)
+        return recent[0] if recent else None
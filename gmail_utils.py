@@ -1,119 +1,174 @@
 import os
 import base64
-import html2text
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from email.message import EmailMessage
 import streamlit as st
 from auth_utils import authenticate_google
-from eval_utils import g_eval, if_eval, halu_eval, truthful_qa_eval
+import html_text
+from gmail_sync import GmailSync
+from eval_queue import eval_queue
+from llm_client import complete, stream
+from tracing import span, traced
 
-try:
-    from groq import Groq
-except ImportError:
-    st.error("❌ Groq package not found. Run `pip install groq`.")
-    st.stop()
+# Same extraction engine as web pages; None uses html_text.DEFAULT_BACKEND.
+HTML_BACKEND = st.secrets.get("html", {}).get("backend")
+# Decoded body size cap; a message's text beyond this never reaches a prompt anyway.
+MAX_BODY_BYTES = int(st.secrets.get("gmail_sync", {}).get("max_body_bytes", 100_000))
+SEND_SETTINGS = st.secrets.get("gmail_send", {})
+# Gmail accepts up to 100 calls per batch; sends are quota-heavy, so stay at the recommended 50.
+SEND_BATCH_SIZE = int(SEND_SETTINGS.get("batch_size", 50))
+SEND_RETRIES = int(SEND_SETTINGS.get("retries", 3))
+SEND_BACKOFF = float(SEND_SETTINGS.get("backoff_seconds", 1.0))
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
-api_key = st.secrets.get("groq", {}).get("api_key", "")
-if not api_key or not api_key.startswith("gsk_"):
-    st.error("❌ Valid Groq API key not found in Streamlit secrets.")
-    st.stop()
+def call_llm(prompt: str):
+    # Returns (text, LLMResult); the result goes to the eval queue as generation metadata.
+    result = complete(prompt)
+    if result.error:
+        return f"❌ Error calling LLM: {result.error}", result
+    return result.text, result
 
-groq_client = Groq(api_key=api_key)
+TOKEN_PATH = "token.pkl"
+# googleapiclient services (httplib2 underneath) are not thread-safe, so each
+# thread keeps its own. It is rebuilt when the credentials expire or token.pkl
+# changes (a refresh or a new sign-in rewrites it).
+_local = threading.local()
 
-def call_llm(prompt: str) -> str:
+def _token_mtime():
     try:
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-specdec",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"❌ Error calling LLM: {e}"
+        return os.path.getmtime(TOKEN_PATH)
+    except OSError:
+        return None
 
 def get_gmail_service():
-    creds = authenticate_google()
-    if not creds:
-        raise Exception("❌ Google authentication failed for Gmail.")
-    return build('gmail', 'v1', credentials=creds)
+    service, creds, mtime = getattr(_local, "gmail", (None, None, None))
+    if service is None or not getattr(creds, "valid", False) or mtime != _token_mtime():
+        creds = authenticate_google()
+        if not creds:
+            raise Exception("❌ Google authentication failed for Gmail.")
+        service = build('gmail', 'v1', credentials=creds)
+        _local.gmail = (service, creds, _token_mtime())
+    return service
+
+def _header(msg, name):
+    return next((h['value'] for h in msg['payload'].get('headers', []) if h['name'] == name), '')
+
+def parse_message(msg, service=None) -> dict:
+    return {
+        'id': msg['id'],
+        'thread_id': msg.get('threadId'),
+        'internal_date': int(msg.get('internalDate', 0)),
+        'sender': _header(msg, 'From'),
+        'subject': _header(msg, 'Subject'),
+        'date': _header(msg, 'Date'),
+        'body': extract_plain_text_from_msg(msg, service),
+        'labels': msg.get('labelIds', []),
+    }
 
+# Reruns of the email view read this mirror; Gmail is only asked for what changed.
+inbox = GmailSync(lambda: get_gmail_service(), parse_message)
+
+@traced("gmail.fetch_latest_email", "google")
 def fetch_latest_email():
     try:
-        service = get_gmail_service()
-        result = service.users().messages().list(userId='me', maxResults=1, q="category:primary").execute()
-        messages = result.get('messages', [])
-        if not messages:
-            return None
-
-        msg_id = messages[0]['id']
-        msg = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-        headers = msg['payload']['headers']
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
-        sender = next((h['value'] for h in headers if h['name'] == 'From'), '')
-        date = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-        body = extract_plain_text_from_msg(msg)
-
-        return {
-            'id': msg_id,
-            'sender': sender,
-            'subject': subject,
-            'date': date,
-            'body': body
-        }
-
+        return inbox.latest()
     except Exception as e:
         st.error(f"❌ Error fetching email: {e}")
         return None
 
-def extract_plain_text_from_msg(msg) -> str:
+@traced("gmail.fetch_recent_emails", "google")
+def fetch_recent_emails(limit=20):
     try:
-        payload = msg['payload']
+        return inbox.messages(limit)
+    except Exception as e:
+        st.error(f"❌ Error fetching emails: {e}")
+        return []
 
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    data = part['body']['data']
-                    return base64.urlsafe_b64decode(data.encode("ASCII")).decode("utf-8")
+def walk_parts(payload):
+    # Leaf parts in document order, however deeply multiparts nest; iterative, so
+    # hostile nesting can't hit the recursion limit.
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        children = part.get('parts')
+        if children:
+            stack.extend(reversed(children))
+        else:
+            yield part
 
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/html':
-                    html_data = part['body']['data']
-                    html = base64.urlsafe_b64decode(html_data.encode("ASCII")).decode("utf-8")
-                    return html2text.html2text(html)
+def choose_text_part(payload):
+    # First inline text/plain, else first inline text/html; attachments (parts with a filename) are skipped.
+    html = None
+    for part in walk_parts(payload):
+        if part.get('filename'):
+            continue
+        mime_type = part.get('mimeType', '')
+        if mime_type == 'text/plain':
+            return part
+        if mime_type == 'text/html' and html is None:
+            html = part
+    return html
 
-        else:
-            body = payload.get('body', {}).get('data', '')
-            if body:
-                decoded = base64.urlsafe_b64decode(body.encode("ASCII")).decode("utf-8")
-                return html2text.html2text(decoded)
+def decode_part_data(data: str, max_bytes: int = MAX_BODY_BYTES) -> str:
+    # Only the base64 needed for max_bytes is decoded (4 characters per 3 bytes).
+    chars = (max_bytes + 2) // 3 * 4
+    data = data[:chars]
+    data += "=" * (-len(data) % 4)
+    return base64.urlsafe_b64decode(data.encode("ASCII")).decode("utf-8", errors="replace")
 
-        return "❓ No readable content found."
+def extract_plain_text_from_msg(msg, service=None) -> str:
+    try:
+        part = choose_text_part(msg['payload'])
+        if part is None:
+            return "❓ No readable content found."
+        body = part.get('body', {})
+        data = body.get('data')
+        if not data and body.get('attachmentId') and service is not None:
+            # Large bodies are stored out of line; fetch just this part.
+            with span("gmail.attachments.get", "google"):
+                data = service.users().messages().attachments().get(
+                    userId='me', messageId=msg['id'], id=body['attachmentId']).execute().get('data')
+        if not data:
+            return "❓ No readable content found."
+        text = decode_part_data(data)
+        if part.get('mimeType') == 'text/html':
+            return html_text.extract(text, backend=HTML_BACKEND)
+        return text
     except Exception as e:
         return f"❌ Error extracting content: {e}"
 
-def summarize_email(email_body: str) -> str:
-    summary = call_llm(f"Summarize the following email:\n\n{email_body}")
-    
-    # Evaluation metrics
-    g_score = g_eval(summary, reference=email_body)
-    if_score = if_eval(summary, source=email_body)
-    truth_score = truthful_qa_eval(summary)
-    input_struct = {"original_email": email_body}
-    halu_score = halu_eval(summary, input_struct)
-
-    print("[G-Eval - Email Summary]", g_score)
-    print("[IFEval - Email Summary]", if_score)
-    print("[TruthfulQA - Email Summary]", truth_score)
-    print("[HALUeval - Email Summary]", halu_score)
-
-    return summary
+def summary_prompt(email_body: str) -> str:
+    return f"Summarize the following email:\n\n{email_body}"
 
-def draft_reply(email: dict, user_message: str) -> str:
-    prompt = (
+def reply_prompt(email: dict, user_message: str) -> str:
+    return (
         f"You received the following email from {email['sender']}:\n\n"
         f"{email['body']}\n\n"
         f"Draft a professional reply based on this message and your response intent:\n\n{user_message}"
     )
-    reply = call_llm(prompt)
+
+def stream_summary(email_body: str):
+    return stream(summary_prompt(email_body))
+
+def stream_reply(email: dict, user_message: str):
+    return stream(reply_prompt(email, user_message))
+
+def summarize_email(email_body: str) -> str:
+    summary, generation = call_llm(summary_prompt(email_body))
+
+    # Evaluation metrics are scored in the background and land in the eval store
+    if not generation.error:
+        eval_queue.submit(summary, email_body, {"original_email": email_body}, label="email_summary",
+                          generation=generation)
+    return summary
+
+def draft_reply(email: dict, user_message: str) -> str:
+    reply, generation = call_llm(reply_prompt(email, user_message))
 
     input_struct = {
         "sender": email["sender"],
@@ -122,17 +177,9 @@ def draft_reply(email: dict, user_message: str) -> str:
         "user_intent": user_message
     }
 
-    # Evaluation metrics
-    g_score = g_eval(reply, reference=email["body"])
-    if_score = if_eval(reply, source=email["body"])
-    truth_score = truthful_qa_eval(reply)
-    halu_score = halu_eval(reply, input_struct)
-
-    print("[G-Eval - Draft Reply]", g_score)
-    print("[IFEval - Draft Reply]", if_score)
-    print("[TruthfulQA - Draft Reply]", truth_score)
-    print("[HALUeval - Draft Reply]", halu_score)
-
+    # Evaluation metrics are scored in the background and land in the eval store
+    if not generation.error:
+        eval_queue.submit(reply, email["body"], input_struct, label="draft_reply", generation=generation)
     return reply
 
 def send_reply_email(reply_text: str, original_email: dict):
@@ -144,7 +191,76 @@ def send_reply_email(reply_text: str, original_email: dict):
         msg['Subject'] = "Re: " + original_email['subject']
         raw_msg = base64.urlsafe_b64encode(msg.as_bytes()).decode()
         message = {'raw': raw_msg}
-        service.users().messages().send(userId="me", body=message).execute()
+        with span("gmail.messages.send", "google"):
+            service.users().messages().send(userId="me", body=message).execute()
         return "✅ Reply sent successfully."
     except Exception as e:
-        return f"❌ Failed to send email: {e}"
\ No newline at end of file
+        return f"❌ Failed to send email: {e}"
+
+@dataclass
+class SendResult:
+    recipient: str
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def build_message(to: str, subject: str, html_body: str, bcc: Optional[str] = None) -> dict:
+    msg = EmailMessage()
+    if to:
+        msg['To'] = to
+    if bcc:
+        msg['Bcc'] = bcc
+    msg['Subject'] = subject
+    msg.set_content(html_body, subtype='html')
+    return {'raw': base64.urlsafe_b64encode(msg.as_bytes()).decode()}
+
+def _retryable(exception) -> bool:
+    # Throttling, server errors and dropped connections; a 4xx like a bad address won't improve.
+    if isinstance(exception, HttpError):
+        return getattr(exception.resp, "status", None) in RETRYABLE_STATUS
+    return isinstance(exception, OSError)
+
+def send_bulk(messages: dict, service=None, retries: int = SEND_RETRIES) -> list:
+    # messages: recipient label -> {'raw': ...}, all built up front. They go out in
+    # Gmail batch requests (one HTTP round trip per SEND_BATCH_SIZE); throttled or
+    # 5xx failures are resent with exponential backoff, other errors are final.
+    # Returns one SendResult per recipient, in the order given.
+    service = service or get_gmail_service()
+    results = {recipient: SendResult(recipient) for recipient in messages}
+    pending = list(messages)
+    with span("gmail.send_bulk", "google", messages=len(pending)) as s:
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(SEND_BACKOFF * 2 ** (attempt - 1))
+            retry = []
+
+            def collect(recipient, response, exception):
+                result = results[recipient]
+                result.attempts += 1
+                if exception is None:
+                    result.message_id, result.error = response.get('id'), None
+                else:
+                    result.error = str(exception)
+                    if _retryable(exception):
+                        retry.append(recipient)
+
+            for start in range(0, len(pending), SEND_BATCH_SIZE):
+                batch = service.new_batch_http_request(callback=collect)
+                for recipient in pending[start:start + SEND_BATCH_SIZE]:
+                    batch.add(service.users().messages().send(userId="me", body=messages[recipient]),
+                              request_id=recipient)
+                try:
+                    batch.execute()
+                except (HttpError, OSError) as e:
+                    # The whole batch request failed; every call in it is retryable or not together.
+                    for recipient in pending[start:start + SEND_BATCH_SIZE]:
+                        collect(recipient, None, e)
+            pending = retry
+            if not pending:
+                break
+        s.set(failed=sum(not r.ok for r in results.values()), attempts=attempt + 1)
+    return [results[recipient] for recipient in messages]
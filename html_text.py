@@ -0,0 +1,131 @@
+# html_text.py
+# HTML-to-text for web pages and Gmail bodies. Scripts, styles and page
+# chrome (nav, footer, aside, forms and ARIA banner/navigation/contentinfo
+# regions) are dropped, and the result is one stripped line per text block.
+# The default stdlib backend parses incrementally and stops as soon as
+# max_chars of text have been produced; selectolax and lxml can be picked
+# explicitly when installed.
+from html.parser import HTMLParser
+from typing import Optional
+
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:
+    lxml = None
+
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head", "iframe"}
+BOILERPLATE_TAGS = {"nav", "footer", "aside", "form"}
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "search"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+FEED_SIZE = 16384
+
+def _lines(text: str, max_chars: Optional[int]) -> str:
+    text = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+    return text[:max_chars] if max_chars else text
+
+# -------------------- stdlib, incremental -------------------- #
+class _Budget(Exception):
+    pass
+
+class _TextCollector(HTMLParser):
+    def __init__(self, skip: set, roles: set, max_chars: Optional[int]):
+        super().__init__(convert_charrefs=True)
+        self.skip = skip
+        self.roles = roles
+        self.max_chars = max_chars
+        self.parts = []
+        self.size = 0
+        self._skipping = []  # tag names whose end closes the current skipped region
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        if self._skipping == ["head"] and tag == "body":
+            self._skipping = []  # </head> is optional
+        if self._skipping:
+            if tag == self._skipping[0]:
+                self._skipping.append(tag)
+            return
+        if tag in self.skip or (self.roles and dict(attrs).get("role") in self.roles):
+            self._skipping.append(tag)
+        else:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if self._skipping:
+            if tag == self._skipping[0]:
+                self._skipping.pop()
+            return
+        self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self._skipping or not data.strip():
+            return
+        self.parts.append(data)
+        self.size += len(data.strip())
+        if self.max_chars and self.size >= self.max_chars:
+            raise _Budget()
+
+def _stream(html: str, max_chars: Optional[int], boilerplate: bool) -> str:
+    collector = _TextCollector(SKIP_TAGS | (BOILERPLATE_TAGS if boilerplate else set()),
+                               BOILERPLATE_ROLES if boilerplate else set(), max_chars)
+    try:
+        for start in range(0, len(html), FEED_SIZE):
+            collector.feed(html[start:start + FEED_SIZE])
+        collector.close()
+    except _Budget:
+        pass
+    return _lines("".join(collector.parts), max_chars)
+
+# -------------------- selectolax -------------------- #
+def _selectolax(html: str, max_chars: Optional[int], boilerplate: bool) -> str:
+    tree = SelectolaxParser(html)
+    selectors = list(SKIP_TAGS - {"head"})
+    if boilerplate:
+        selectors += list(BOILERPLATE_TAGS) + [f'[role="{role}"]' for role in BOILERPLATE_ROLES]
+    for node in tree.css(", ".join(selectors)):
+        node.decompose()
+    root = tree.body or tree.root
+    return _lines(root.text(separator="\n") if root is not None else "", max_chars)
+
+# -------------------- lxml -------------------- #
+def _lxml(html: str, max_chars: Optional[int], boilerplate: bool) -> str:
+    if not html.strip():
+        return ""
+    # Bytes, because lxml rejects str input that carries an <?xml encoding=...?> declaration.
+    parser = lxml.html.HTMLParser(encoding="utf-8")
+    try:
+        doc = lxml.html.document_fromstring(html.encode("utf-8"), parser=parser)
+    except lxml.etree.ParserError:
+        return ""  # "Document is empty", e.g. a body that is only a comment
+    tags = SKIP_TAGS | (BOILERPLATE_TAGS if boilerplate else set())
+    xpath = " | ".join(f"//{tag}" for tag in tags)
+    if boilerplate:
+        xpath += " | " + " | ".join(f'//*[@role="{role}"]' for role in BOILERPLATE_ROLES)
+    for node in doc.xpath(xpath):
+        if node.getparent() is not None:
+            node.drop_tree()
+    return _lines("\n".join(doc.itertext()), max_chars)
+
+BACKENDS = {"stream": _stream}
+if SelectolaxParser is not None:
+    BACKENDS["selectolax"] = _selectolax
+if lxml is not None:
+    BACKENDS["lxml"] = _lxml
+# The stream backend stops at max_chars, which makes it the fastest on long pages.
+DEFAULT_BACKEND = "stream"
+
+def extract(html: str, max_chars: Optional[int] = None, backend: Optional[str] = None,
+            boilerplate: bool = True) -> str:
+    # backend="stream" is the one that stops reading at max_chars; the tree
+    # parsers build the whole document first and cut afterwards.
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown or unavailable HTML backend: {backend}")
+    return BACKENDS[backend](html or "", max_chars, boilerplate)
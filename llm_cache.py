@@ -0,0 +1,130 @@
+# llm_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+CACHE_PATH = ".llm_cache.sqlite"
+MAX_MEMORY_ENTRIES = 512
+MAX_DISK_ENTRIES = 20000
+TTL_SECONDS = 7 * 24 * 3600
+
+def cache_key(model: str, messages: list, params: Optional[dict] = None) -> str:
+    payload = json.dumps({"model": model, "messages": messages, "params": params or {}}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    # Two tiers: an in-process LRU in front of a SQLite file that survives restarts.
+    # Entries expire after ttl_seconds; each tier evicts least-recently-used rows when full.
+    def __init__(self, path=CACHE_PATH, max_memory_entries=MAX_MEMORY_ENTRIES,
+                 max_disk_entries=MAX_DISK_ENTRIES, ttl_seconds=TTL_SECONDS):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes_since_prune = 0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit and now - hit[1] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return hit[0]
+            self._memory.pop(key, None)
+
+            try:
+                db = self._db()
+                row = db.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row and now - row[1] < self.ttl_seconds:
+                    db.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    db.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.counters["disk_hits"] += 1
+                    return value
+                if row:
+                    db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache read failed: {e}")
+
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: dict):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now, now),
+                )
+                db.commit()
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 100:
+                    self._prune(db, now)
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache write failed: {e}")
+
+    def _prune(self, db, now):
+        self._writes_since_prune = 0
+        db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        overflow = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_disk_entries
+        if overflow > 0:
+            db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self.counters["evictions"] += overflow
+        db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            try:
+                self._db().execute("DELETE FROM llm_cache")
+                self._db().commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM cache clear failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "memory_entries": len(self._memory),
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+llm_cache = LLMCache()
@@ -0,0 +1,250 @@
+# llm_client.py
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+import httpx
+import streamlit as st
+from llm_cache import llm_cache, cache_key
+from tracing import span, start_span
+from llm_scheduler import RateLimitScheduler, PRIORITY_INTERACTIVE, estimate_tokens
+
+try:
+    from groq import Groq
+except ImportError:
+    st.error("❌ Groq package not found. Run `pip install groq`.")
+    st.stop()
+
+GROQ_SETTINGS = st.secrets.get("groq", {})
+API_KEY = GROQ_SETTINGS.get("api_key", "")
+if not API_KEY or not API_KEY.startswith("gsk_"):
+    st.error("❌ Valid Groq API key not found in Streamlit secrets.")
+    st.stop()
+
+DEFAULT_MODEL = GROQ_SETTINGS.get("model", "llama-3.3-70b-specdec")
+MAX_CONCURRENCY = int(GROQ_SETTINGS.get("max_concurrency", 8))
+REQUEST_TIMEOUT = float(GROQ_SETTINGS.get("timeout", 60))
+KEEPALIVE_SECONDS = 120
+
+# Groq's own retries are disabled; the scheduler retries with a shared view of the rate limits.
+scheduler = RateLimitScheduler(
+    requests_per_minute=int(GROQ_SETTINGS.get("requests_per_minute", 30)),
+    tokens_per_minute=int(GROQ_SETTINGS.get("tokens_per_minute", 6000)),
+    max_retries=int(GROQ_SETTINGS.get("max_retries", 4)),
+)
+
+@dataclass
+class LLMResult:
+    text: str
+    model: str
+    latency: float
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached: bool = False
+    error: Optional[str] = None
+    messages: Optional[list] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        if self.prompt_tokens is None or self.completion_tokens is None:
+            return None
+        return self.prompt_tokens + self.completion_tokens
+
+_client = None
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+def get_client():
+    # One Groq client per process, built on first use. The shared httpx pool keeps
+    # TLS connections to the API alive between calls instead of reconnecting each time.
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    timeout=REQUEST_TIMEOUT,
+                    limits=httpx.Limits(
+                        max_connections=MAX_CONCURRENCY,
+                        max_keepalive_connections=MAX_CONCURRENCY,
+                        keepalive_expiry=KEEPALIVE_SECONDS,
+                    ),
+                )
+                _client = Groq(api_key=API_KEY, http_client=http_client, max_retries=0)
+    return _client
+
+def set_client(client):
+    # Swap in another client object with the same chat.completions.create interface.
+    global _client
+    with _client_lock:
+        _client = client
+
+def complete(prompt: Optional[str] = None, messages: Optional[list] = None, model: Optional[str] = None,
+             use_cache: bool = True, priority: int = PRIORITY_INTERACTIVE, **params) -> LLMResult:
+    model = model or DEFAULT_MODEL
+    messages = messages or [{"role": "user", "content": prompt}]
+    with span("llm.complete", "llm", model=model, priority=priority) as s:
+        result = _complete(messages, model, use_cache, priority, params)
+        result.messages = messages
+        s.set(cached=result.cached, prompt_tokens=result.prompt_tokens, completion_tokens=result.completion_tokens)
+        if result.error:
+            s.error = result.error
+        return result
+
+def _complete(messages: list, model: str, use_cache: bool, priority: int, params: dict) -> LLMResult:
+    start = time.time()
+
+    key = cache_key(model, messages, params)
+    if use_cache:
+        hit = llm_cache.get(key)
+        if hit is not None:
+            return LLMResult(
+                text=hit["text"].strip(),
+                model=model,
+                latency=round(time.time() - start, 2),
+                prompt_tokens=hit.get("prompt_tokens"),
+                completion_tokens=hit.get("completion_tokens"),
+                cached=True,
+            )
+
+    def call():
+        with _slots:
+            return get_client().chat.completions.create(model=model, messages=messages, **params)
+
+    tokens = estimate_tokens(messages, params.get("max_tokens") or 512)
+    try:
+        response = scheduler.run(call, priority, tokens)
+    except Exception as e:
+        return LLMResult(text="", model=model, latency=round(time.time() - start, 2), error=str(e))
+
+    text = response.choices[0].message.content or ""
+    usage = getattr(response, "usage", None)
+    result = LLMResult(
+        text=text.strip(),
+        model=model,
+        latency=round(time.time() - start, 2),
+        prompt_tokens=getattr(usage, "prompt_tokens", None),
+        completion_tokens=getattr(usage, "completion_tokens", None),
+    )
+    scheduler.record_usage(tokens, result.total_tokens)
+    if use_cache:
+        llm_cache.set(key, {
+            "text": text,
+            "prompt_tokens": result.prompt_tokens,
+            "completion_tokens": result.completion_tokens,
+        })
+    return result
+
+class LLMStream:
+    # Iterating yields text deltas as they arrive; timings, usage and the full
+    # text are filled in once the stream is exhausted.
+    def __init__(self, messages: list, model: str, use_cache: bool, priority: int, params: dict):
+        self.messages = messages
+        self.model = model
+        self.use_cache = use_cache
+        self.priority = priority
+        self.params = params
+        self.text = ""
+        self.first_token_latency = None
+        self.latency = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.cached = False
+        self.error = None
+
+    def _total_tokens(self):
+        if self.prompt_tokens is None or self.completion_tokens is None:
+            return None
+        return self.prompt_tokens + self.completion_tokens
+
+    def __iter__(self):
+        s = start_span("llm.stream", "llm", model=self.model, priority=self.priority)
+        try:
+            yield from self._iter()
+        finally:
+            s.set(cached=self.cached, first_token_latency=self.first_token_latency,
+                  prompt_tokens=self.prompt_tokens, completion_tokens=self.completion_tokens)
+            s.end(self.error)
+
+    def _iter(self):
+        start = time.time()
+        key = cache_key(self.model, self.messages, self.params)
+        hit = llm_cache.get(key) if self.use_cache else None
+        if hit is not None:
+            self.cached = True
+            self.text = hit["text"].strip()
+            self.prompt_tokens = hit.get("prompt_tokens")
+            self.completion_tokens = hit.get("completion_tokens")
+            self.first_token_latency = self.latency = round(time.time() - start, 2)
+            yield self.text
+            return
+
+        def open_stream():
+            _slots.acquire()
+            try:
+                return get_client().chat.completions.create(
+                    model=self.model, messages=self.messages, stream=True, **self.params
+                )
+            except BaseException:
+                _slots.release()
+                raise
+
+        tokens = estimate_tokens(self.messages, self.params.get("max_tokens") or 512)
+        parts = []
+        try:
+            chunks = scheduler.run(open_stream, self.priority, tokens)
+            try:
+                for chunk in chunks:
+                    usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+                    if usage is not None:
+                        self.prompt_tokens = getattr(usage, "prompt_tokens", None)
+                        self.completion_tokens = getattr(usage, "completion_tokens", None)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    if self.first_token_latency is None:
+                        self.first_token_latency = round(time.time() - start, 2)
+                    parts.append(delta)
+                    yield delta
+            finally:
+                _slots.release()
+        except Exception as e:
+            self.error = str(e)
+            yield f"❌ LLM Error: {e}"
+        finally:
+            self.text = "".join(parts).strip()
+            self.latency = round(time.time() - start, 2)
+        scheduler.record_usage(tokens, None if self.error else self._total_tokens())
+
+        if self.use_cache and self.error is None:
+            llm_cache.set(key, {
+                "text": self.text,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            })
+
+class FailedStream:
+    # Stands in for an LLMStream when the work fails before the model is called
+    # (e.g. building the prompt); yields the error text once, like a failed stream.
+    def __init__(self, message: str, model: Optional[str] = None):
+        self.messages = None
+        self.model = model or DEFAULT_MODEL
+        self.text = message
+        self.error = message
+        self.first_token_latency = None
+        self.latency = 0.0
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.cached = False
+
+    def __iter__(self):
+        yield self.text
+
+def stream(prompt: Optional[str] = None, messages: Optional[list] = None, model: Optional[str] = None,
+           use_cache: bool = True, priority: int = PRIORITY_INTERACTIVE, **params) -> LLMStream:
+    return LLMStream(messages or [{"role": "user", "content": prompt}], model or DEFAULT_MODEL, use_cache, priority, params)
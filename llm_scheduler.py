@@ -0,0 +1,156 @@
+# llm_scheduler.py
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+
+try:
+    import groq
+    RETRYABLE_ERRORS = (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError)
+except ImportError:
+    RETRYABLE_ERRORS = ()
+
+# Lower number = served first. User-facing generations jump ahead of queued evaluations.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+WINDOW_SECONDS = 60
+
+def estimate_tokens(messages: list, max_tokens: int = 512) -> int:
+    # ~4 characters per token for English text, plus the completion allowance.
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // 4 + max_tokens
+
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue
+    return None
+
+class RateLimitScheduler:
+    # Admits calls against sliding one-minute request and token budgets. Waiting
+    # callers are released strictly in (priority, arrival) order, so a burst of
+    # background evals can't starve an interactive generation.
+    def __init__(self, requests_per_minute=30, tokens_per_minute=6000, max_retries=4,
+                 base_delay=1.0, max_delay=30.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._window = deque()  # (timestamp, requests, tokens)
+        self._paused_until = 0.0
+        self.counters = {"admitted": 0, "retries": 0, "rate_limited": 0, "failed": 0}
+
+    def _expire(self, now):
+        while self._window and self._window[0][0] <= now - WINDOW_SECONDS:
+            self._window.popleft()
+
+    def _wait_time(self, now, tokens):
+        wait = self._paused_until - now
+        if not self._window:
+            return wait
+        used_requests = sum(r for _, r, _ in self._window)
+        if used_requests >= self.requests_per_minute:
+            needed = used_requests - self.requests_per_minute + 1
+            for ts, requests, _ in self._window:
+                needed -= requests
+                if needed <= 0:
+                    wait = max(wait, ts + WINDOW_SECONDS - now)
+                    break
+        used_tokens = sum(t for _, _, t in self._window)
+        if used_tokens + tokens > self.tokens_per_minute:
+            # Wait until enough of the window has rolled off; an oversized call
+            # only needs an empty window so it can never deadlock.
+            excess = used_tokens + tokens - self.tokens_per_minute
+            for ts, _, spent in self._window:
+                excess -= spent
+                if excess <= 0:
+                    break
+            wait = max(wait, ts + WINDOW_SECONDS - now)
+        return wait
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, tokens=0):
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.time()
+                    self._expire(now)
+                    if self._waiting[0] == ticket:
+                        wait = self._wait_time(now, tokens)
+                        if wait <= 0:
+                            heapq.heappop(self._waiting)
+                            self._window.append((now, 1, tokens))
+                            self.counters["admitted"] += 1
+                            return
+                        self._cond.wait(timeout=wait)
+                    else:
+                        self._cond.wait(timeout=1.0)
+            finally:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        # Correct the budget once the real token count is known.
+        if actual_tokens is None:
+            return
+        with self._cond:
+            self._window.append((time.time(), 0, actual_tokens - estimated_tokens))
+            self._cond.notify_all()
+
+    def pause(self, seconds):
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+            self._cond.notify_all()
+
+    def backoff_delay(self, attempt):
+        # Full jitter: uniform over [0, base * 2^attempt], capped.
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def run(self, fn, priority=PRIORITY_INTERACTIVE, tokens=0):
+        attempt = 0
+        while True:
+            self.acquire(priority, tokens)
+            try:
+                return fn()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self.counters["failed"] += 1
+                    raise
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    # The provider told us when capacity returns; hold every caller until then.
+                    self.counters["rate_limited"] += 1
+                    delay = retry_after + random.uniform(0, self.base_delay)
+                    self.pause(delay)
+                else:
+                    delay = self.backoff_delay(attempt)
+                self.counters["retries"] += 1
+                attempt += 1
+                time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._expire(time.time())
+            return {
+                **self.counters,
+                "queued": len(self._waiting),
+                "requests_last_minute": sum(r for _, r, _ in self._window),
+                "tokens_last_minute": sum(t for _, _, t in self._window),
+            }
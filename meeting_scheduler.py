@@ -0,0 +1,114 @@
+# meeting_scheduler.py
+# The "🚀 Schedule" flow as one call. Calendar credentials are loaded while the
+# Zoom meeting is being created; once the join URL exists, the calendar insert
+# and the invitation batch run in parallel, so the whole flow takes about as
+# long as Zoom plus the slower of the two. The agenda evaluation is queued at
+# the end, never awaited, and only for a meeting that was kept. Each step's
+# time is recorded.
+#
+# Rollback: if no invitation was delivered, a failed step deletes whatever was
+# created (the calendar event, then the Zoom meeting). Once any invitee holds the
+# join URL the meeting is kept, and the failure is only reported.
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+import zoom_utils
+from tracing import span, bind
+
+@dataclass
+class StepTiming:
+    name: str
+    seconds: float
+    error: Optional[str] = None
+
+@dataclass
+class ScheduleResult:
+    join_url: Optional[str] = None
+    calendar_link: Optional[str] = None
+    invitations: list = field(default_factory=list)  # gmail_utils.SendResult per recipient
+    steps: list = field(default_factory=list)  # StepTiming, in completion order
+    rolled_back: list = field(default_factory=list)
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def failed_invitations(self) -> list:
+        return [r for r in self.invitations if not r.ok]
+
+def _step(name: str, fn: Callable, result: ScheduleResult):
+    # Runs one step under its own span; returns (value, error) instead of raising.
+    start = time.perf_counter()
+    with span(f"schedule.{name}", "internal") as s:
+        try:
+            value, error = fn(), None
+        except Exception as e:
+            value, error = None, str(e)
+            s.set(error=error)
+    result.steps.append(StepTiming(name, round(time.perf_counter() - start, 2), error))
+    return value, error
+
+def _create_meeting(topic, start_time, duration, time_zone):
+    meeting, status = zoom_utils.create_zoom_meeting(topic, start_time, duration, time_zone)
+    if not meeting:
+        raise Exception(status)
+    return meeting
+
+def _send(subject, body, recipients, single_message):
+    # Gmail services are per thread (httplib2 isn't thread-safe), so send_invitations
+    # gets this worker's own one rather than a service built elsewhere.
+    invitations = zoom_utils.send_invitations(subject, body, recipients, single_message)
+    if invitations and not any(r.ok for r in invitations):
+        raise Exception(f"❌ No invitation was delivered: {invitations[0].error}")
+    return invitations
+
+def schedule_meeting(topic, start_time, duration, time_zone, recipients, single_message=False) -> ScheduleResult:
+    result = ScheduleResult()
+    started = time.perf_counter()
+    subject = f"📌 Zoom Meeting: {topic}"
+    with span("meeting.schedule", "internal", recipients=len(recipients)) as s, \
+            ThreadPoolExecutor(max_workers=3) as pool:
+        # Independent of Zoom: load the token and build the Calendar service now. It is
+        # used by one step at a time (the insert, then any rollback), never concurrently.
+        calendar_service = pool.submit(bind(lambda: _step("google_auth", zoom_utils.get_calendar_service, result)))
+
+        meeting, error = _step("zoom", lambda: _create_meeting(topic, start_time, duration, time_zone), result)
+        if error:
+            result.error = error
+            result.seconds = round(time.perf_counter() - started, 2)
+            return result
+        result.join_url = meeting.get("join_url")
+
+        body = {"time": start_time.strftime('%Y-%m-%d %I:%M %p'), "link": result.join_url}
+        event_future = pool.submit(bind(lambda: _step("calendar", lambda: zoom_utils.create_calendar_event(
+            topic, start_time, duration, time_zone, result.join_url, calendar_service.result()[0]), result)))
+        invite_future = pool.submit(bind(lambda: _step(
+            "invitations", lambda: _send(subject, body, recipients, single_message), result)))
+        event, event_error = event_future.result()
+        invitations, invite_error = invite_future.result()
+        result.invitations = invitations or []
+        if event:
+            result.calendar_link = event.get("htmlLink")
+
+        errors = [e for e in (event_error, invite_error) if e]
+        if errors and not any(r.ok for r in result.invitations):
+            undo = [("zoom", lambda: zoom_utils.delete_zoom_meeting(meeting["id"]))]
+            if event:
+                undo.insert(0, ("calendar", lambda: zoom_utils.delete_calendar_event(event["id"], calendar_service.result()[0])))
+            for name, fn in undo:
+                _, rollback_error = _step(f"rollback_{name}", fn, result)
+                if rollback_error:
+                    errors.append(rollback_error)
+                else:
+                    result.rolled_back.append(name)
+            result.join_url = result.calendar_link = None
+        result.error = " | ".join(errors) or None
+        if result.join_url:
+            zoom_utils.submit_agenda_eval(topic, start_time, duration)
+        s.set(failed_invitations=len(result.failed_invitations), rolled_back=",".join(result.rolled_back))
+    result.seconds = round(time.perf_counter() - started, 2)
+    return result
@@ -0,0 +1,309 @@
+# meeting_summary.py
+# Map-reduce summarization for transcript sets of any length. Each meeting is
+# split into token windows, every window is summarized concurrently (summary
+# and sentiment in the same call), and the partial results are merged in
+# batches until one final call, which callers can stream, combines them.
+# Per-meeting results are stored by content hash, so a view only pays for
+# meetings it hasn't summarized before.
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+import pandas as pd
+import streamlit as st
+import context_builder
+import llm_client
+from llm_client import complete, stream, DEFAULT_MODEL
+from tracing import span, bind
+
+SUMMARY_SETTINGS = st.secrets.get("meeting_summary", {})
+# Transcript tokens per map call, and partial-summary tokens per reduce call.
+CHUNK_TOKENS = int(SUMMARY_SETTINGS.get("chunk_tokens", 2000))
+REDUCE_TOKENS = int(SUMMARY_SETTINGS.get("reduce_tokens", context_builder.budget_for(DEFAULT_MODEL)))
+MAX_WORKERS = int(SUMMARY_SETTINGS.get("max_workers", 4))
+# Map calls per summary. Unless max_chunks is set, it is sized so the map phase
+# spends at most BUDGET_MINUTES of the Groq token budget ([groq] tokens_per_minute):
+# 4 chunks on the default 6000 TPM, up to 48 on a higher tier. Each call costs the
+# window plus the scheduler's 512-token completion allowance.
+BUDGET_MINUTES = float(SUMMARY_SETTINGS.get("budget_minutes", 2))
+MAP_CALL_TOKENS = CHUNK_TOKENS + 512
+MAX_CHUNKS = int(SUMMARY_SETTINGS.get("max_chunks", min(48, max(
+    1, int(llm_client.scheduler.tokens_per_minute * BUDGET_MINUTES // MAP_CALL_TOKENS)))))
+STORE_PATH = SUMMARY_SETTINGS.get("store_path", ".meeting_summaries.sqlite")
+
+SECTIONS = "Reply in exactly this format:\n#### Summary\n<summary>\n#### Sentiment\n<sentiment analysis>"
+MAP_PROMPT = (
+    "Summarize this part of a meeting transcript and analyze its sentiment.{focus}\n\n"
+    "{label}\n{text}\n\n" + SECTIONS
+)
+REDUCE_PROMPT = (
+    "Below are summaries and sentiment notes for consecutive parts of one or more meetings. "
+    "Combine them into a single summary of the whole and one overall sentiment analysis, "
+    "keeping decisions, owners and dates.{focus}\n\n{text}\n\n" + SECTIONS
+)
+_SENTIMENT_HEADING = re.compile(r"^#+\s*sentiment\b.*$", re.IGNORECASE | re.MULTILINE)
+_SUMMARY_HEADING = re.compile(r"^#+\s*summary\b.*$\n?", re.IGNORECASE | re.MULTILINE)
+
+@dataclass
+class Part:
+    label: str
+    text: str
+
+@dataclass
+class MeetingSummary:
+    summary: str
+    sentiment: str
+    summarized: int
+    error: Optional[str] = None
+    notice: Optional[str] = None
+
+@dataclass
+class FinalPrompt:
+    prompt: str
+    misses: int
+    # Set when the reply itself is one meeting's summary and should be stored under this key.
+    store_key: Optional[str] = None
+    # Set when MAX_CHUNKS left meetings out or cut them short.
+    notice: Optional[str] = None
+
+def split_sections(text: str):
+    # (summary, sentiment) from a reply in SECTIONS format; a reply without headings is all summary.
+    match = _SENTIMENT_HEADING.search(text)
+    summary, sentiment = (text[:match.start()], text[match.end():]) if match else (text, "")
+    return _SUMMARY_HEADING.sub("", summary, count=1).strip(), sentiment.strip()
+
+def _focus(focus: Optional[str]) -> str:
+    return f" Pay particular attention to: {focus}." if focus else ""
+
+class SummaryStore:
+    # Per-meeting summary and sentiment in SQLite, keyed by a hash of the
+    # model, focus and transcript text, so an edited transcript is a new key
+    # and entries never need invalidating.
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meeting_summaries ("
+                "key TEXT PRIMARY KEY, summary TEXT NOT NULL, sentiment TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, keys: list) -> dict:
+        if not keys:
+            return {}
+        with self._lock:
+            try:
+                rows = self._db().execute(
+                    f"SELECT key, summary, sentiment FROM meeting_summaries WHERE key IN ({', '.join('?' for _ in keys)})",
+                    keys,
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"⚠️ Meeting summary store read failed: {e}")
+                return {}
+        return {key: (summary, sentiment) for key, summary, sentiment in rows}
+
+    def put(self, key: str, summary: str, sentiment: str):
+        with self._lock:
+            try:
+                self._db().execute(
+                    "INSERT OR REPLACE INTO meeting_summaries (key, summary, sentiment, created_at) VALUES (?, ?, ?, ?)",
+                    (key, summary, sentiment, time.time()),
+                )
+                self._db().commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Meeting summary store write failed: {e}")
+
+summary_store = SummaryStore()
+
+@dataclass
+class Meeting:
+    key: str
+    label: str
+    windows: list
+    partial: bool = False
+
+def meeting_key(content: str, focus: Optional[str] = None, model: str = DEFAULT_MODEL) -> str:
+    payload = json.dumps([model, focus or "", content], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def split_meetings(df: pd.DataFrame, focus: Optional[str] = None, window: int = CHUNK_TOKENS) -> list:
+    # One Meeting per transcript row in chronological order, its text split into token windows.
+    meetings = []
+    for row in df.sort_values(by="created_at").to_dict("records"):
+        content = row["content"] or ""
+        windows = [chunk.text for chunk in context_builder.split_text(content, max_tokens=window)]
+        if not windows:
+            continue
+        when = row["created_at"].strftime("%Y-%m-%d %H:%M") if pd.notna(row["created_at"]) else "undated"
+        meetings.append(Meeting(meeting_key(content, focus), f"Meeting on {when}:", windows))
+    return meetings
+
+def _run(prompt: str) -> str:
+    result = complete(prompt)
+    if result.error:
+        raise RuntimeError(result.error)
+    return result.text
+
+def _part(label: str, summary: str, sentiment: str) -> Part:
+    return Part(label, f"Summary: {summary}\nSentiment: {sentiment}")
+
+def _as_part(label: str, reply: str) -> Part:
+    return _part(label, *split_sections(reply))
+
+def _batches(parts: list, budget: int) -> list:
+    # Consecutive parts grouped so each reduce input fits the budget (at least two per batch).
+    batches, current, used = [], [], 0
+    for part in parts:
+        tokens = context_builder.count_tokens(part.label + part.text)
+        if len(current) >= 2 and used + tokens > budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(part)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def _join(parts: list) -> str:
+    return "\n\n".join(f"{p.label}\n{p.text}" for p in parts)
+
+def _parallel(fn, items: list) -> list:
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = [pool.submit(bind(lambda item=item: fn(item))) for item in items]
+        return [f.result() for f in futures]
+
+def _reduce(parts: list, focus: Optional[str], level_name: str) -> list:
+    # Merges parts in budget-sized batches until they fit one reduce call.
+    levels = 0
+    while len(_batches(parts, REDUCE_TOKENS)) > 1:
+        with span(level_name, "internal", level=levels, parts=len(parts)):
+            parts = _parallel(
+                lambda batch: _as_part(
+                    f"{batch[0].label.rstrip(':')} to {batch[-1].label}" if len(batch) > 1 else batch[0].label,
+                    _run(REDUCE_PROMPT.format(focus=_focus(focus), text=_join(batch))),
+                ),
+                _batches(parts, REDUCE_TOKENS),
+            )
+        levels += 1
+    return parts
+
+def _summarize_meeting(meeting: Meeting, windows: list, focus: Optional[str]) -> Part:
+    # windows holds (label, summary, sentiment) per window, in order.
+    if len(windows) == 1:
+        _, summary, sentiment = windows[0]
+    else:
+        parts = _reduce([_part(*w) for w in windows], focus, "meetings.reduce_meeting")
+        summary, sentiment = split_sections(_run(REDUCE_PROMPT.format(focus=_focus(focus), text=_join(parts))))
+    if not meeting.partial:
+        summary_store.put(meeting.key, summary, sentiment)
+    return _part(meeting.label, summary, sentiment)
+
+def cap_notice(dropped: int, truncated: int) -> Optional[str]:
+    if not dropped and not truncated:
+        return None
+    return (f"⚠️ Only the most recent transcript text fits the {MAX_CHUNKS}-chunk limit: "
+            f"{dropped} older meeting(s) were left out and {truncated} only partly summarized.")
+
+def meeting_parts(meetings: list, focus: Optional[str] = None):
+    # One Part per meeting. Stored summaries are reused; only meetings not seen
+    # before (for this model and focus) are mapped and merged.
+    # Returns (parts, misses, notice); notice says what the MAX_CHUNKS cap left out.
+    stored = summary_store.get_many([m.key for m in meetings])
+    # Identical transcripts share a key and are summarized once.
+    missing = list({m.key: m for m in meetings if m.key not in stored}.values())
+    # Wall time is bounded by capping the map fan-out; beyond it the most recent windows win.
+    budget, capped = MAX_CHUNKS, []
+    for meeting in reversed(missing):
+        if budget <= 0:
+            break
+        capped.append(Meeting(meeting.key, meeting.label, meeting.windows[-budget:], len(meeting.windows) > budget))
+        budget -= len(capped[-1].windows)
+    notice = cap_notice(len(missing) - len(capped), sum(m.partial for m in capped))
+    missing = capped[::-1]
+
+    computed = {}
+    if missing:
+        windows = [
+            (m, Part(f"{m.label.rstrip(':')} (part {n} of {len(m.windows)}):" if len(m.windows) > 1 else m.label, text))
+            for m in missing for n, text in enumerate(m.windows, 1)
+        ]
+        with span("meetings.map", "internal", chunks=len(windows), stored=len(stored)):
+            mapped = _parallel(
+                lambda item: (item[1].label, *split_sections(_run(
+                    MAP_PROMPT.format(focus=_focus(focus), label=item[1].label, text=item[1].text)))),
+                windows,
+            )
+        by_meeting = {}
+        for (meeting, _), result in zip(windows, mapped):
+            by_meeting.setdefault(meeting.key, []).append(result)
+        results = _parallel(lambda m: _summarize_meeting(m, by_meeting[m.key], focus), missing)
+        computed = {m.key: part for m, part in zip(missing, results)}
+
+    parts = []
+    for meeting in meetings:
+        if meeting.key in stored:
+            parts.append(_part(meeting.label, *stored[meeting.key]))
+        elif meeting.key in computed:
+            parts.append(computed[meeting.key])
+    return parts, len(missing), notice
+
+def final_prompt(df: pd.DataFrame, focus: Optional[str] = None) -> FinalPrompt:
+    # Runs the map step and any intermediate reduces, and returns the last call's
+    # prompt, so the caller decides whether to complete or stream it.
+    # Identical final prompts are answered from the LLM cache.
+    meetings = split_meetings(df, focus)
+    if not meetings:
+        raise ValueError("no transcript content to summarize")
+    if len(meetings) == 1 and len(meetings[0].windows) == 1:
+        # A single short meeting is one streamed call; its reply is that meeting's
+        # stored summary, so later multi-meeting views don't map it again.
+        meeting = meetings[0]
+        prompt = MAP_PROMPT.format(focus=_focus(focus), label=meeting.label, text=meeting.windows[0])
+        return FinalPrompt(prompt, 1, store_key=meeting.key)
+    parts, misses, notice = meeting_parts(meetings, focus)
+    parts = _reduce(parts, focus, "meetings.reduce")
+    return FinalPrompt(REDUCE_PROMPT.format(focus=_focus(focus), text=_join(parts)), misses, notice=notice)
+
+def summarize(df: pd.DataFrame, focus: Optional[str] = None) -> MeetingSummary:
+    with span("meetings.map_reduce", "internal") as s:
+        try:
+            final = final_prompt(df, focus)
+            summary, sentiment = split_sections(_run(final.prompt))
+            if final.store_key:
+                summary_store.put(final.store_key, summary, sentiment)
+            s.set(summarized=final.misses)
+            return MeetingSummary(summary, sentiment, final.misses, notice=final.notice)
+        except Exception as e:
+            return MeetingSummary("", "", 0, error=str(e))
+
+class SummaryStream:
+    # Wraps the final LLMStream: same attributes, plus the cap notice, and a
+    # single meeting's reply is stored once the stream has finished cleanly.
+    def __init__(self, inner, final: FinalPrompt):
+        self.inner = inner
+        self.store_key = final.store_key
+        self.notice = final.notice
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def __iter__(self):
+        yield from self.inner
+        if self.store_key and not self.inner.error:
+            summary_store.put(self.store_key, *split_sections(self.inner.text))
+
+def stream_summary(df: pd.DataFrame, focus: Optional[str] = None) -> SummaryStream:
+    # The final combine as a stream; split_sections(stream.text) gives the two parts once it is done.
+    final = final_prompt(df, focus)
+    return SummaryStream(stream(final.prompt), final)
@@ -0,0 +1,110 @@
+# queries.py
+# Parameterized, column-projected queries over the assistant's tables. None of
+# them select the embedding columns. Reads go through table_cache, which only
+# asks for rows past its watermark; until that cache is loaded, the aggregate
+# and date-range helpers below answer from Postgres, which filters, groups and
+# limits so transfer scales with the result. Deletes run here directly.
+from datetime import date, datetime, timedelta
+import pandas as pd
+import db
+
+TASKS_TABLE = "tasks_embeddings_shikha_20250326"
+WEB_TABLE = "webdata_embeddings_shikha_20250326"
+TRANSCRIPTS_TABLE = "meeting_embeddings_shikha_20250401_new_6"
+
+TASK_COLUMNS = "id, title, task_type, due_date, due_time"
+WEB_COLUMNS = "id, url, cleaned_title, visittime, visitcount"
+TRANSCRIPT_COLUMNS = "id, category, content, created_at"
+
+# The range filters below are written so these indexes can serve them; they are
+# created when the connection pool starts (see db.register_setup).
+INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS {TASKS_TABLE}_due_idx ON {TASKS_TABLE} (due_date, due_time)",
+    f"CREATE INDEX IF NOT EXISTS {WEB_TABLE}_visittime_idx ON {WEB_TABLE} (visittime)",
+    f"CREATE INDEX IF NOT EXISTS {TRANSCRIPTS_TABLE}_created_idx ON {TRANSCRIPTS_TABLE} (created_at)",
+]
+
+db.register_setup(INDEXES)
+
+def _day(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+def _month_bounds(year: int, month: int):
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+def with_due_datetime(df: pd.DataFrame) -> pd.DataFrame:
+    df['due_datetime'] = pd.to_datetime(df['due_date'].astype(str) + ' ' + df['due_time'].astype(str))
+    return df.sort_values(by='due_datetime')
+
+# -------------------- Tasks -------------------- #
+def tasks_since(last_id=None) -> pd.DataFrame:
+    # Incremental sync: ids are assigned in insert order, so the watermark is the highest id seen.
+    if last_id is None:
+        return db.read_sql(f"SELECT {TASK_COLUMNS} FROM {TASKS_TABLE} ORDER BY id")
+    return db.read_sql(f"SELECT {TASK_COLUMNS} FROM {TASKS_TABLE} WHERE id >= %s ORDER BY id", (int(last_id),))
+
+# due_date's column type isn't declared anywhere in this repo, so it is cast to
+# date before comparing; a text column would otherwise compare as strings.
+def tasks_for_month(ym: str) -> pd.DataFrame:
+    # ym is "YYYY-MM".
+    start, end = _month_bounds(*map(int, ym.split("-")))
+    return with_due_datetime(db.read_sql(
+        f"SELECT {TASK_COLUMNS} FROM {TASKS_TABLE} WHERE due_date::date >= %s AND due_date::date < %s",
+        (start, end),
+    ))
+
+def delete_tasks(ids: list) -> int:
+    return db.execute(f"DELETE FROM {TASKS_TABLE} WHERE id = ANY(%s)", ([int(i) for i in ids],))
+
+def delete_tasks_on(day) -> list:
+    day = _day(day)
+    with db.cursor(commit=True) as cur:
+        cur.execute(
+            f"DELETE FROM {TASKS_TABLE} WHERE due_date::date = %s RETURNING id",
+            (day,),
+        )
+        return [row[0] for row in cur.fetchall()]
+
+# -------------------- Web visits -------------------- #
+def web_visits_since(since=None) -> pd.DataFrame:
+    # >= rather than >: rows sharing the watermark timestamp may land after a sync.
+    if since is None:
+        return db.read_sql(f"SELECT {WEB_COLUMNS} FROM {WEB_TABLE}")
+    return db.read_sql(f"SELECT {WEB_COLUMNS} FROM {WEB_TABLE} WHERE visittime >= %s", (since,))
+
+def top_sites(year: int, month: int, n: int = 5) -> pd.DataFrame:
+    # visitcount is summed the way top_visited_websites does it: non-numeric counts as 0.
+    start, end = _month_bounds(year, month)
+    df = db.read_sql(
+        f"""SELECT url,
+                   SUM(CASE WHEN visitcount::text ~ '^[0-9]+(\\.[0-9]+)?$'
+                            THEN FLOOR(visitcount::text::numeric) ELSE 0 END)::bigint AS visitcount
+            FROM {WEB_TABLE}
+            WHERE visittime >= %s AND visittime < %s
+            GROUP BY url
+            ORDER BY visitcount DESC
+            LIMIT %s""",
+        (start.isoformat(), end.isoformat(), int(n)),
+    )
+    df['visitcount'] = df['visitcount'].astype(int)
+    return df
+
+# -------------------- Meeting transcripts -------------------- #
+def _transcripts(where: str = "", params: tuple = ()) -> pd.DataFrame:
+    sql = f"SELECT {TRANSCRIPT_COLUMNS} FROM {TRANSCRIPTS_TABLE} WHERE category <> 'chats'"
+    if where:
+        sql += " AND " + where
+    sql += " ORDER BY created_at DESC"
+    df = db.read_sql(sql, params)
+    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
+    return df
+
+def transcripts_on(day) -> pd.DataFrame:
+    day = _day(day)
+    return _transcripts("created_at >= %s AND created_at < %s",
+                        (day.isoformat(), (day + timedelta(days=1)).isoformat()))
+
+def transcripts_since(since=None) -> pd.DataFrame:
+    return _transcripts("created_at >= %s", (since,)) if since is not None else _transcripts()
@@ -0,0 +1,185 @@
+# retrieval.py
+# Top-k semantic search over the *_embeddings_* tables. The query is embedded
+# on CPU with sentence-transformers and matched with pgvector; when the
+# extension or column type isn't available (or `pgvector = false`), the local
+# memory-mapped index in vector_index.py answers instead.
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+import pandas as pd
+import streamlit as st
+import db
+import queries
+import vector_index
+from tracing import span, traced
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+RETRIEVAL_SETTINGS = st.secrets.get("retrieval", {})
+# Must be the model the stored embeddings were built with.
+EMBEDDING_MODEL = RETRIEVAL_SETTINGS.get("model", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_COLUMN = RETRIEVAL_SETTINGS.get("embedding_column", "embedding")
+USE_PGVECTOR = bool(RETRIEVAL_SETTINGS.get("pgvector", True))
+# undefined_function ("operator does not exist") and undefined_object ("type vector does not exist").
+PGVECTOR_MISSING_CODES = {"42883", "42704"}
+# After any other pgvector failure, searches use the local index for this long.
+PGVECTOR_RETRY_AFTER = float(RETRIEVAL_SETTINGS.get("pgvector_retry_after", 60))
+_pgvector_retry_at = 0.0
+DEFAULT_TOP_K = int(RETRIEVAL_SETTINGS.get("top_k", 20))
+# How often the local index checks Postgres for newly embedded rows.
+LOCAL_SYNC_INTERVAL = float(RETRIEVAL_SETTINGS.get("local_sync_interval", 300))
+
+@dataclass(frozen=True)
+class Corpus:
+    table: str
+    columns: str
+    where: str = ""
+
+CORPORA = {
+    "tasks": Corpus(queries.TASKS_TABLE, queries.TASK_COLUMNS),
+    "web": Corpus(queries.WEB_TABLE, queries.WEB_COLUMNS),
+    "meetings": Corpus(queries.TRANSCRIPTS_TABLE, queries.TRANSCRIPT_COLUMNS, "category <> 'chats'"),
+}
+
+class RetrievalUnavailable(RuntimeError):
+    pass
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    global _model
+    if SentenceTransformer is None:
+        raise RetrievalUnavailable("sentence-transformers is not installed")
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    return _model
+
+@traced("retrieval.embed", "embedding")
+def embed(texts: list) -> np.ndarray:
+    vectors = get_model().encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    return vectors.astype(np.float32)
+
+def parse_vector(value) -> np.ndarray:
+    # pgvector returns "[0.1,0.2,...]" without a registered adapter; float[] columns return lists.
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+def _vector_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.7g}" for x in vector) + "]"
+
+# -------------------- pgvector -------------------- #
+def ensure_vector_indexes(method: str = "hnsw"):
+    # HNSW (or ivfflat) cosine indexes so ORDER BY <=> is an ANN scan. Run once by hand.
+    db.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    for corpus in CORPORA.values():
+        db.execute(
+            f"CREATE INDEX IF NOT EXISTS {corpus.table}_{EMBEDDING_COLUMN}_{method}_idx "
+            f"ON {corpus.table} USING {method} ({EMBEDDING_COLUMN} vector_cosine_ops)"
+        )
+
+def _pgvector_search(corpus: Corpus, vector: np.ndarray, k: int) -> pd.DataFrame:
+    where = f"WHERE {corpus.where}" if corpus.where else ""
+    literal = _vector_literal(vector)
+    return db.read_sql(
+        f"SELECT {corpus.columns}, {EMBEDDING_COLUMN} <=> %s::vector AS distance "
+        f"FROM {corpus.table} {where} ORDER BY {EMBEDDING_COLUMN} <=> %s::vector LIMIT %s",
+        (literal, literal, int(k)),
+    )
+
+# -------------------- Local mmap index -------------------- #
+_indexes = {}
+_synced_at = {}
+_index_lock = threading.Lock()
+
+def local_index(name: str, max_age: float = LOCAL_SYNC_INTERVAL) -> vector_index.MmapIndex:
+    # Opens the corpus' .npy (a single mmap) and appends any rows added since
+    # the last sync. The first ever call has to pull every embedding once.
+    with _index_lock:
+        index = _indexes.setdefault(name, vector_index.MmapIndex(name))
+        if time.time() - _synced_at.get(name, 0.0) > max_age:
+            sync_local_index(name)
+            _synced_at[name] = time.time()
+        return index
+
+def sync_local_index(name: str, batch_size: int = 5000) -> int:
+    # Appends rows with ids above the index's highest id, in batches; never rebuilds.
+    corpus = CORPORA[name]
+    index = _indexes.setdefault(name, vector_index.MmapIndex(name))
+    clauses = [f"{EMBEDDING_COLUMN} IS NOT NULL"] + ([corpus.where] if corpus.where else [])
+    added = 0
+    with span(f"retrieval.sync_index.{name}", "db") as s:
+        while True:
+            last = index.max_id()
+            condition = " AND ".join(clauses + ([] if last is None else ["id > %s"]))
+            params = (batch_size,) if last is None else (last, batch_size)
+            df = db.read_sql(
+                f"SELECT id, {EMBEDDING_COLUMN} FROM {corpus.table} WHERE {condition} ORDER BY id LIMIT %s",
+                params,
+            )
+            if not len(df):
+                break
+            index.add(df["id"].to_numpy(), np.vstack([parse_vector(v) for v in df[EMBEDDING_COLUMN]]))
+            added += len(df)
+            if len(df) < batch_size:
+                break
+        s.set(added=added)
+    return added
+
+def forget(name: str, ids):
+    # Delete hook, mirroring table_cache: deleted rows stop matching immediately.
+    with _index_lock:
+        index = _indexes.setdefault(name, vector_index.MmapIndex(name))
+    index.remove(ids)
+
+def _local_search(name: str, vector: np.ndarray, k: int) -> pd.DataFrame:
+    corpus = CORPORA[name]
+    ids, distances = local_index(name).search(vector[None, :], k)
+    ids, distances = ids[0], distances[0]
+    if not len(ids):
+        return pd.DataFrame()
+    rows = db.read_sql(f"SELECT {corpus.columns} FROM {corpus.table} WHERE id = ANY(%s)", ([int(i) for i in ids],))
+    order = {int(i): d for i, d in zip(ids, distances)}
+    rows["distance"] = rows["id"].map(lambda i: order[int(i)])
+    return rows.sort_values("distance").reset_index(drop=True)
+
+def rank_ids(name: str, query: str, ids, k: Optional[int] = None) -> list:
+    # Orders rows the caller already has by similarity to query, using the local
+    # index only, so no rows are re-read. Ids missing from the index are dropped.
+    ids = [int(i) for i in ids]
+    with span(f"retrieval.rank.{name}", "retrieval", candidates=len(ids)):
+        vector = embed([query])[0]
+        ranked, _ = local_index(name).search(vector[None, :], k or len(ids), ids)
+    return [int(i) for i in ranked[0]]
+
+# -------------------- API -------------------- #
+def search(name: str, query: str, k: int = DEFAULT_TOP_K) -> pd.DataFrame:
+    # Returns the k rows of corpus `name` closest to `query`, nearest first, with a cosine distance column.
+    global USE_PGVECTOR, _pgvector_retry_at
+    with span(f"retrieval.search.{name}", "retrieval", k=k) as s:
+        vector = embed([query])[0]
+        if USE_PGVECTOR and time.time() >= _pgvector_retry_at:
+            try:
+                rows = _pgvector_search(CORPORA[name], vector, k)
+                s.set(backend="pgvector")
+                return rows
+            except Exception as e:
+                if getattr(e, "pgcode", None) in PGVECTOR_MISSING_CODES:
+                    # Extension missing or column not a vector: use the in-process index from now on.
+                    print(f"⚠️ pgvector search unavailable, using the local index: {e}")
+                    USE_PGVECTOR = False
+                else:
+                    # Timeouts, dropped connections: fall back for a while, then try pgvector again.
+                    print(f"⚠️ pgvector search failed, using the local index for {PGVECTOR_RETRY_AFTER:.0f}s: {e}")
+                    _pgvector_retry_at = time.time() + PGVECTOR_RETRY_AFTER
+        s.set(backend="local")
+        return _local_search(name, vector, k)
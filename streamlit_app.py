@@ -8,21 +8,22 @@ except Exception:
     pass
 
 import streamlit as st
-st.cache_data.clear()
 import pandas as pd
 import time
 from datetime import datetime, timedelta
-from gmail_utils import fetch_latest_email, summarize_email, draft_reply, send_reply_email
+from gmail_utils import fetch_recent_emails, stream_summary, stream_reply, send_reply_email
 from zoom_utils import (
-    schedule_zoom_meeting,
-    send_email_reminder,
+    submit_meeting_eval,
     authenticate_google,
-    summarize_meetings,
-    summarize_latest_meeting,
-    get_transcripts,
-    add_to_calendar
+    stream_meeting_summary,
+    get_transcripts
 )
-from eval_utils import g_eval, if_eval, halu_eval, truthful_qa_eval
+from meeting_scheduler import schedule_meeting
+from meeting_summary import split_sections
+from email_triage import load_emails, triage, PRIORITIES
+from eval_queue import eval_queue
+from eval_store import eval_store
+from tracing import trace, breakdown, recent_traces
 from calendar_utils import (
     suggest_task_slot_today,
     delete_last_task_today,
@@ -30,13 +31,54 @@ from calendar_utils import (
     show_tasks_by_month,
     get_task_df
 )
-from web_utils import fetch_web_data, process_prompt_with_webdata, evaluate_web_response, top_visited_websites
-
-st.cache_data.clear()
+from web_utils import fetch_web_data, stream_prompt_with_webdata, fetch_top_sites
 
 st.set_page_config(page_title="Shikha's Personalized AI Assistant", page_icon="🤖")
 st.title("🤖 Shikha's Personalized AI Assistant")
 
+EVAL_LABELS = {"g_eval": "G-Eval", "if_eval": "IFEval", "truthful_qa": "TruthfulQA", "halu_eval": "HALUeval"}
+
+def show_performance(request):
+    # Breakdown of one response's trace: self time per kind, then the span tree,
+    # then this session's recent requests from the memory exporter.
+    with st.expander("⚡ Performance"):
+        st.markdown("**Where the time went (seconds)**")
+        st.bar_chart(pd.Series(breakdown(request), name="seconds"))
+        total = max(request.elapsed, 1e-9)
+        rows = [
+            {
+                "span": "· " * depth + s.name,
+                "kind": s.kind,
+                "seconds": round(s.elapsed, 3),
+                "share": f"{100 * s.elapsed / total:.0f}%",
+                "error": s.error or "",
+            }
+            for depth, s in request.walk()
+        ]
+        st.dataframe(pd.DataFrame(rows), hide_index=True)
+        history = [
+            {"request": t.name, "seconds": round(t.elapsed, 3), "error": t.error or ""}
+            for t in reversed(recent_traces())
+        ]
+        if len(history) > 1:
+            st.markdown("**Recent requests in this session**")
+            st.dataframe(pd.DataFrame(history), hide_index=True)
+
+def show_eval_metrics(response_id, labels=None):
+    # Metrics are computed by the background eval queue; until they land, offer a refresh.
+    job = eval_queue.status(response_id)
+    if job is None or job["status"] == "pending":
+        st.info("⏳ Evaluation metrics are still being computed.")
+        st.button("🔄 Refresh Metrics", key=f"refresh_{response_id}")
+        return
+    if job["status"] == "failed":
+        st.error(f"❌ Evaluation failed: {job['error']}")
+        return
+    names = {**EVAL_LABELS, **(labels or {})}
+    for key, score in job["scores"].items():
+        st.markdown(f"**{names.get(key, key)}**")
+        st.code(score)
+
 if not st.session_state.get("google_authenticated"):
     st.subheader("🔐 Google Authorization Required")
     silent_auth = authenticate_google(interactive=False)
@@ -78,6 +120,10 @@ if st.session_state.step == "greet":
             st.session_state.step = "collect_zoom_info"
         elif "summarize zoom" in normalized:
             st.session_state.step = "summarize_meeting"
+        elif "report" in normalized or "metrics" in normalized:
+            st.session_state.step = "eval_report"
+        elif "triage" in normalized or "inbox" in normalized:
+            st.session_state.step = "email_triage"
         elif "email" in normalized or "summarize" in normalized:
             st.session_state.step = "email_assistant"
         elif "calendar" in normalized or "task" in normalized:
@@ -85,7 +131,7 @@ if st.session_state.step == "greet":
         elif "web" in normalized or "browse" in normalized:
             st.session_state.step = "web_insights"
         else:
-            st.warning("Try: 'schedule zoom meeting', 'summarize email', 'manage calendar', or 'web_insights'.")
+            st.warning("Try: 'schedule zoom meeting', 'summarize email', 'triage inbox', 'manage calendar', 'web_insights', or 'eval report'.")
 
 if st.session_state.step == "collect_zoom_info":
     st.subheader("🗕️ Schedule Zoom Meeting")
@@ -98,21 +144,26 @@ if st.session_state.step == "collect_zoom_info":
 
     if st.button("🚀 Schedule"):
         if topic and emails:
-            start_datetime = datetime.combine(date, time_input)
-            zoom_link, zoom_status, zoom_time = schedule_zoom_meeting(topic, start_datetime, duration, timezone)
-            if zoom_link:
-                cal_link, cal_time = add_to_calendar(topic, start_datetime, duration, timezone, zoom_link)
-                email_sent, email_time = send_email_reminder(
-                    f"📌 Zoom Meeting: {topic}",
-                    {"time": start_datetime.strftime('%Y-%m-%d %I:%M %p'), "link": zoom_link},
-                    [e.strip() for e in emails.split(",")]
-                )
-                st.success("✅ Zoom Meeting Scheduled!")
-                st.markdown(f"[🔗 Join Meeting]({zoom_link})")
-                st.markdown(f"[📅 View in Calendar]({cal_link})")
-                st.caption(f"⏱️ Zoom API Time: {zoom_time}s | Calendar: {cal_time}s | Email: {email_time}s")
-            else:
-                st.error(zoom_status)
+            with trace("zoom.schedule") as request:
+                start_datetime = datetime.combine(date, time_input)
+                outcome = schedule_meeting(topic, start_datetime, duration, timezone,
+                                           [e.strip() for e in emails.split(",")])
+                if outcome.join_url:
+                    st.success("✅ Zoom Meeting Scheduled!")
+                    st.markdown(f"[🔗 Join Meeting]({outcome.join_url})")
+                    if outcome.calendar_link:
+                        st.markdown(f"[📅 View in Calendar]({outcome.calendar_link})")
+                    if outcome.error:
+                        st.warning(outcome.error)
+                    for failed in outcome.failed_invitations:
+                        st.warning(f"⚠️ Invitation to {failed.recipient} failed: {failed.error}")
+                else:
+                    st.error(outcome.error)
+                    if outcome.rolled_back:
+                        st.info(f"↩️ Rolled back: {', '.join(outcome.rolled_back)}")
+                st.caption("⏱️ " + " | ".join(f"{t.name}: {t.seconds}s" for t in outcome.steps)
+                           + f" | Total: {outcome.seconds}s")
+            show_performance(request)
             st.session_state.step = "greet"
         else:
             st.error("Please complete all fields.")
@@ -122,95 +173,129 @@ if st.session_state.step == "collect_zoom_info":
 
 if st.session_state.step == "email_assistant":
     st.subheader("📧 Gmail AI Assistant")
-    email_action = st.selectbox("Choose Action", ["Show Latest Email", "Summarize Latest Email", "Draft Reply"])
-    start_time = time.time()
-    email = fetch_latest_email()
-
-    if not email:
-        st.error("❌ No emails found.")
-    else:
-        st.markdown(f"**From:** {email['sender']}")
-        st.markdown(f"**Subject:** {email['subject']}")
-        st.markdown(f"**Date:** {email['date']}")
-        st.text_area("Body", email['body'], height=200)
-
-        if email_action == "Summarize Latest Email":
-            summary = summarize_email(email["body"])
-            st.subheader("📌 Summary")
-            st.info(summary)
-
-            with st.expander("📊 Evaluation Metrics"):
-                st.markdown("**G-Eval**")
-                st.code(g_eval(summary, reference=email["body"]))
-                st.markdown("**IFEval**")
-                st.code(if_eval(summary, source=email["body"]))
-                st.markdown("**TruthfulQA**")
-                st.code(truthful_qa_eval(summary))
-                st.markdown("**HALUeval**")
-                st.code(halu_eval(summary, {"original_email": email["body"]}))
-
-        elif email_action == "Draft Reply":
-            st.subheader("✉️ Drafted Reply")
-            user_intent = "Please reply professionally to this inquiry."
-            reply = draft_reply(email, user_intent)
-            st.text_area("Reply Draft", reply, height=200)
-
-            input_struct = {
-                "sender": email["sender"],
-                "subject": email["subject"],
-                "original_message": email["body"],
-                "user_intent": user_intent
-            }
-
-            with st.expander("📊 Evaluation Metrics"):
-                st.markdown("**G-Eval**")
-                st.code(g_eval(reply, reference=email["body"]))
-                st.markdown("**IFEval**")
-                st.code(if_eval(reply, source=email["body"]))
-                st.markdown("**TruthfulQA**")
-                st.code(truthful_qa_eval(reply))
-                st.markdown("**HALUeval**")
-                st.code(halu_eval(reply, input_struct))
-
-            if st.button("✅ Send Reply"):
-                status = send_reply_email(reply, email)
-                st.success(status)
-
-    end_time = time.time()
-    st.caption(f"⏱️ Response Time: {round(end_time - start_time, 2)} seconds")
+    recent_emails = fetch_recent_emails()
+    email = st.selectbox(
+        "Email", recent_emails, format_func=lambda m: f"{m['sender']} — {m['subject']}",
+    ) if recent_emails else None
+    email_action = st.selectbox("Choose Action", ["Show Email", "Summarize Email", "Draft Reply"])
+    with trace("email.assistant", action=email_action) as request:
+        first_token = None
+
+        if not email:
+            st.error("❌ No emails found.")
+        else:
+            st.markdown(f"**From:** {email['sender']}")
+            st.markdown(f"**Subject:** {email['subject']}")
+            st.markdown(f"**Date:** {email['date']}")
+            st.text_area("Body", email['body'], height=200)
+
+            if email_action == "Summarize Email":
+                st.subheader("📌 Summary")
+                summary_stream = stream_summary(email["body"])
+                st.write_stream(summary_stream)
+                summary = summary_stream.text
+                first_token = summary_stream.first_token_latency
+
+                if not summary_stream.error:
+                    eval_id = eval_queue.submit(summary, email["body"], {"original_email": email["body"]},
+                                                label="email_summary", generation=summary_stream)
+                    with st.expander("📊 Evaluation Metrics"):
+                        show_eval_metrics(eval_id)
+
+            elif email_action == "Draft Reply":
+                st.subheader("✉️ Drafted Reply")
+                user_intent = "Please reply professionally to this inquiry."
+                reply_stream = stream_reply(email, user_intent)
+                st.write_stream(reply_stream)
+                reply = reply_stream.text
+                first_token = reply_stream.first_token_latency
+
+                input_struct = {
+                    "sender": email["sender"],
+                    "subject": email["subject"],
+                    "original_message": email["body"],
+                    "user_intent": user_intent
+                }
+
+                # A failed generation is neither scored nor offered for sending.
+                if not reply_stream.error:
+                    eval_id = eval_queue.submit(reply, email["body"], input_struct, label="draft_reply",
+                                                generation=reply_stream)
+                    with st.expander("📊 Evaluation Metrics"):
+                        show_eval_metrics(eval_id)
+
+                    if st.button("✅ Send Reply"):
+                        status = send_reply_email(reply, email)
+                        st.success(status)
+
+        first_token_note = f" | First token: {first_token} seconds" if first_token is not None else ""
+        st.caption(f"⏱️ Response Time: {round(request.elapsed, 2)} seconds{first_token_note}")
+    show_performance(request)
 
     if st.button("🔙 Return to Main Menu"):
         st.session_state.step = "greet"
         
+if st.session_state.step == "email_triage":
+    st.subheader("🗂️ Inbox Triage")
+    count = st.number_input("Emails to triage", min_value=5, max_value=100, value=50, step=5)
+    query = st.text_input("Gmail query (optional)", placeholder="e.g. is:unread newer_than:1d")
+
+    if st.button("⚡ Triage"):
+        with trace("email.triage") as request:
+            try:
+                emails = load_emails(int(count), query.strip() or None)
+            except Exception as e:
+                st.error(f"❌ Error fetching emails: {e}")
+                emails = None
+            if emails == []:
+                st.warning("⚠️ No emails found.")
+            elif emails:
+                table = st.empty()
+                rows = []
+                # Rows appear as each thread finishes; highest priority first.
+                for row in triage(emails):
+                    rows.append(row.as_dict())
+                    frame = pd.DataFrame(rows)
+                    frame["_rank"] = frame["priority"].map({p: i for i, p in enumerate(PRIORITIES)})
+                    table.dataframe(frame.sort_values("_rank").drop(columns=["_rank", "thread_id"]), use_container_width=True)
+                st.caption(f"⏱️ {len(emails)} emails in {len(rows)} threads triaged in {round(request.elapsed, 2)} seconds")
+        show_performance(request)
+
+    if st.button("🔙 Return to Main Menu"):
+        st.session_state.step = "greet"
+
 if st.session_state.step == "summarize_meeting":
     st.subheader("📁 Summarize & Analyze Meetings")
     view_mode = st.radio("Filter by", ["Latest", "By Date"], horizontal=True)
-    transcripts = get_transcripts()
-    filtered_df = transcripts.copy()
-
     if view_mode == "By Date":
         selected_date = st.date_input("Pick a Date")
-        filtered_df = filtered_df[filtered_df["created_at"].dt.date == selected_date]
+        filtered_df = get_transcripts(selected_date)
+    else:
+        filtered_df = get_transcripts()
+    focus = st.text_input("Focus on (optional)", placeholder="e.g. budget decisions")
 
     if st.button("📄 Generate Summary & Sentiment"):
         if filtered_df.empty:
             st.warning("⚠️ No transcripts found for this filter.")
         else:
-            summary, sentiment, response_time = summarize_meetings(filtered_df)
-            st.markdown("### ✅ Summary")
-            st.info(summary or "No summary generated.")
-            st.markdown("### 🔈 Sentiment")
-            st.success(sentiment or "No sentiment detected.")
-            st.caption(f"⏱️ Response Time: {response_time} seconds")
-
-            with st.expander("📊 Evaluation Metrics"):
-                joined_text = " ".join(filtered_df["content"].tolist())
-                st.markdown("**G-Eval**")
-                st.code(g_eval(summary, reference=joined_text))
-                st.markdown("**IFEval**")
-                st.code(if_eval(summary, source=joined_text))
-                st.markdown("**TruthfulQA - Sentiment**")
-                st.code(truthful_qa_eval(sentiment))
+            with trace("meetings.summarize") as request:
+                with st.spinner("Summarizing transcripts..."):
+                    summary_stream = stream_meeting_summary(filtered_df, focus)
+                st.markdown("### ✅ Summary & 🔈 Sentiment")
+                st.write_stream(summary_stream)
+                if getattr(summary_stream, "notice", None):
+                    st.info(summary_stream.notice)
+                response_time = round(request.elapsed, 2)
+                st.caption(f"⏱️ Response Time: {response_time} seconds | First token: {summary_stream.first_token_latency} seconds")
+                if not summary_stream.error:
+                    summary, sentiment = split_sections(summary_stream.text)
+                    joined_text = " ".join(filtered_df["content"].tolist())
+                    st.session_state.meeting_eval_id = submit_meeting_eval(summary, sentiment, joined_text, summary_stream)
+            show_performance(request)
+
+    if st.session_state.get("meeting_eval_id"):
+        with st.expander("📊 Evaluation Metrics"):
+            show_eval_metrics(st.session_state.meeting_eval_id, {"truthful_qa": "TruthfulQA - Sentiment"})
 
     if st.button("🔙 Return to Main Menu"):
         st.session_state.step = "greet"
@@ -222,15 +307,20 @@ if st.session_state.step == "calendar_task":
 
     # Suggest slot and show evaluations
     if st.button("✨ Suggest Doctor Appointment Slot Today"):
-        st.subheader("📅 Suggesting Available Time Slot")
-        with st.spinner("Checking available calendar slots..."):
-            result_msg = suggest_task_slot_today("Doctor Appointment", duration_minutes=30)
+        with trace("calendar.suggest_slot") as request:
+            st.subheader("📅 Suggesting Available Time Slot")
+            with st.spinner("Checking available calendar slots..."):
+                result_msg = suggest_task_slot_today("Doctor Appointment", duration_minutes=30)
 
-        if result_msg.startswith("✅"):
-            st.success(result_msg)
-            st.markdown("✅ Evaluation metrics shown above ⬆️")
-        else:
-            st.warning(result_msg)
+            if result_msg.startswith("✅"):
+                st.success(result_msg)
+            else:
+                st.warning(result_msg)
+        show_performance(request)
+
+    if st.session_state.get("calendar_eval_id"):
+        st.markdown("### 📊 Evaluation Metrics")
+        show_eval_metrics(st.session_state.calendar_eval_id)
 
     # Delete last task today
     if st.button("🗑️ Delete Today's Last Task"):
@@ -282,7 +372,7 @@ if st.session_state.step == "web_insights":
                 )
 
             if st.button("📊 Show Top Sites"):
-                top_sites = top_visited_websites(df_web, selected_year, selected_month[1])
+                top_sites = fetch_top_sites(selected_year, selected_month[1])
                 if isinstance(top_sites, str):
                     st.warning(top_sites)
                 elif top_sites.empty:
@@ -299,14 +389,18 @@ if st.session_state.step == "web_insights":
 
             if ask_shikha and shikha_query:
                 with st.spinner("Thinking..."):
-                    response, duration = process_prompt_with_webdata(shikha_query, df_web)
-                    st.success(response)
-                    st.caption(f"⏱️ Response Time: {duration} seconds")
-
-                    if st.checkbox("🧪 Evaluate", key="eval_shikha"):
-                        result = evaluate_web_response(shikha_query, response)
-                        st.markdown("### 📊 Evaluation")
-                        st.code(result)
+                    with trace("web.history") as request:
+                        response_stream = stream_prompt_with_webdata(shikha_query, df_web)
+                        st.write_stream(response_stream)
+                        response = response_stream.text
+                        st.caption(f"⏱️ Response Time: {response_stream.latency} seconds | First token: {response_stream.first_token_latency} seconds")
+                        st.session_state.shikha_eval_id = None if response_stream.error else eval_queue.submit(
+                            response, shikha_query, label="web_history", generation=response_stream)
+                    show_performance(request)
+
+            if st.session_state.get("shikha_eval_id"):
+                with st.expander("🧪 Evaluation"):
+                    show_eval_metrics(st.session_state.shikha_eval_id)
 
         with tab2:
             st.markdown("### 🔍 Real-time Web Lookup")
@@ -318,12 +412,40 @@ if st.session_state.step == "web_insights":
 
             if run_search and search_query:
                 with st.spinner("Fetching from the web..."):
-                    response, time_taken = process_prompt_with_webdata(search_query, pd.DataFrame())
-                    st.success(response)
-                    st.caption(f"⏱️ Response Time: {time_taken} seconds")
-                    if st.checkbox("🧪 Evaluate", key="eval_web"):
-                        result = evaluate_web_response(search_query, response)
-                        st.code(result)
+                    with trace("web.search") as request:
+                        response_stream = stream_prompt_with_webdata(search_query, pd.DataFrame())
+                        st.write_stream(response_stream)
+                        response = response_stream.text
+                        st.caption(f"⏱️ Response Time: {response_stream.latency} seconds | First token: {response_stream.first_token_latency} seconds")
+                        st.session_state.web_eval_id = None if response_stream.error else eval_queue.submit(
+                            response, search_query, label="web_search", generation=response_stream)
+                    show_performance(request)
+
+            if st.session_state.get("web_eval_id"):
+                with st.expander("🧪 Evaluation"):
+                    show_eval_metrics(st.session_state.web_eval_id)
 
     if st.button("🔙 Return to Main Menu"):
-        st.session_state.step = "greet"
\ No newline at end of file
+        st.session_state.step = "greet"
+
+if st.session_state.step == "eval_report":
+    st.subheader("📈 Evaluation Report")
+    window = st.selectbox("Window", [("Last 24 hours", 1), ("Last 7 days", 7), ("Last 30 days", 30), ("All time", None)],
+                          format_func=lambda x: x[0])
+    since = time.time() - window[1] * 86400 if window[1] else None
+
+    latency = eval_store.latency_report(since=since)
+    if latency.empty:
+        st.info("No evaluated responses in this window yet.")
+    else:
+        st.markdown("### ⏱️ Latency per Feature (seconds)")
+        st.dataframe(latency)
+        st.markdown("### 📊 Score Distribution")
+        st.dataframe(eval_store.score_distribution(since=since))
+        st.markdown("### 🧾 Recent Evaluations")
+        recent = pd.DataFrame(eval_store.recent(limit=20))
+        st.dataframe(recent[["feature", "status", "model", "g_eval", "if_eval", "truthful_qa", "halu_eval",
+                             "gen_latency", "eval_latency"]])
+
+    if st.button("🔙 Return to Main Menu"):
+        st.session_state.step = "greet"
@@ -0,0 +1,163 @@
+# table_cache.py
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+import pandas as pd
+import streamlit as st
+import queries
+from tracing import span
+
+CACHE_SETTINGS = st.secrets.get("table_cache", {})
+CACHE_PATH = CACHE_SETTINGS.get("path", ".table_cache.sqlite")
+# Reads within this many seconds of the last sync are served without touching Postgres.
+SYNC_INTERVAL = float(CACHE_SETTINGS.get("sync_interval", 60))
+# Incremental sync can't see rows edited or deleted elsewhere; a periodic full reload can.
+FULL_RELOAD_INTERVAL = float(CACHE_SETTINGS.get("full_reload_interval", 6 * 3600))
+
+class SyncedTable:
+    # Local copy of one Postgres table (projected columns only). Rows are kept in
+    # memory and mirrored to a SQLite file so a restart starts warm. sync() pulls
+    # rows at or after the stored watermark and de-duplicates on id.
+    def __init__(self, name: str, fetch_since: Callable, watermark: str,
+                 prepare: Optional[Callable] = None, path=CACHE_PATH):
+        self.name = name
+        self.fetch_since = fetch_since
+        self.watermark_column = watermark
+        self.prepare = prepare or (lambda df: df)
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = None
+        self._frame = None
+        self._watermark = None
+        self._synced_at = 0.0
+        self._full_at = 0.0
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                "name TEXT PRIMARY KEY, watermark TEXT, synced_at REAL, full_at REAL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    @property
+    def _table(self) -> str:
+        return f"cache_{self.name}"
+
+    def _load_local(self):
+        db = self._db()
+        state = db.execute("SELECT watermark, full_at FROM sync_state WHERE name = ?", (self.name,)).fetchone()
+        exists = db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self._table,)).fetchone()
+        if not state or not exists:
+            return False
+        self._frame = self.prepare(pd.read_sql(f"SELECT * FROM {self._table}", db))
+        self._watermark = json.loads(state[0]) if state[0] else None
+        self._full_at = state[1] or 0.0
+        return True
+
+    def _save_state(self):
+        db = self._db()
+        db.execute(
+            "INSERT OR REPLACE INTO sync_state (name, watermark, synced_at, full_at) VALUES (?, ?, ?, ?)",
+            (self.name, json.dumps(self._watermark, default=str), self._synced_at, self._full_at),
+        )
+        db.commit()
+
+    def _store_rows(self, rows: pd.DataFrame, replace: bool):
+        db = self._db()
+        local = rows.copy()
+        for column in local.columns:
+            if pd.api.types.is_datetime64_any_dtype(local[column]):
+                local[column] = local[column].astype(str)
+        if replace:
+            local.to_sql(self._table, db, if_exists="replace", index=False)
+        else:
+            if len(local):
+                placeholders = ", ".join("?" for _ in local["id"])
+                db.execute(f"DELETE FROM {self._table} WHERE id IN ({placeholders})", [int(i) for i in local["id"]])
+            local.to_sql(self._table, db, if_exists="append", index=False)
+        db.commit()
+
+    def _advance_watermark(self, rows: pd.DataFrame):
+        if len(rows):
+            latest = rows[self.watermark_column].max()
+            if isinstance(latest, pd.Timestamp):
+                latest = latest.isoformat()
+            elif hasattr(latest, "item"):
+                latest = latest.item()
+            self._watermark = latest
+
+    def reload(self):
+        with self._lock, span(f"table_cache.reload.{self.name}", "db"):
+            rows = self.prepare(self.fetch_since(None))
+            self._frame = rows
+            self._watermark = None
+            self._advance_watermark(rows)
+            self._synced_at = self._full_at = time.time()
+            self._store_rows(rows, replace=True)
+            self._save_state()
+
+    def sync(self):
+        with self._lock, span(f"table_cache.sync.{self.name}", "db") as s:
+            rows = self.prepare(self.fetch_since(self._watermark))
+            s.set(rows=len(rows))
+            if len(rows):
+                kept = self._frame[~self._frame["id"].isin(rows["id"])]
+                self._frame = pd.concat([kept, rows], ignore_index=True) if len(kept) else rows
+                self._advance_watermark(rows)
+                self._store_rows(rows, replace=False)
+            self._synced_at = time.time()
+            self._save_state()
+
+    def frame(self, max_age: float = SYNC_INTERVAL) -> pd.DataFrame:
+        # The caller gets a copy, so filtering or adding columns can't corrupt the cache.
+        with self._lock:
+            now = time.time()
+            if self._frame is None and not self._load_local():
+                self.reload()
+            elif now - self._full_at > FULL_RELOAD_INTERVAL:
+                self.reload()
+            elif now - self._synced_at > max_age:
+                self.sync()
+            return self._frame.copy()
+
+    def loaded(self) -> bool:
+        # True when frame() can answer without pulling the whole table: rows are in
+        # memory or in the local SQLite copy (which this then loads).
+        with self._lock:
+            return self._frame is not None or self._load_local()
+
+    def forget(self, ids):
+        # Delete hook: drop rows the app just deleted in Postgres.
+        ids = [int(i) for i in ids]
+        if not ids:
+            return
+        with self._lock:
+            if self._frame is not None:
+                self._frame = self._frame[~self._frame["id"].isin(ids)].reset_index(drop=True)
+            db = self._db()
+            exists = db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self._table,)).fetchone()
+            if exists:
+                db.execute(f"DELETE FROM {self._table} WHERE id IN ({', '.join('?' for _ in ids)})", ids)
+                db.commit()
+
+def _prepare_tasks(df):
+    return queries.with_due_datetime(df)
+
+def _prepare_web(df):
+    df["visittime"] = pd.to_datetime(df["visittime"], errors="coerce")
+    df = df.dropna(subset=["visittime"]).reset_index(drop=True)
+    df["visitDate"] = pd.to_datetime(df["visittime"].dt.date)
+    return df
+
+def _prepare_transcripts(df):
+    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
+    return df
+
+tasks_cache = SyncedTable("tasks", queries.tasks_since, "id", _prepare_tasks)
+web_visits_cache = SyncedTable("web_visits", queries.web_visits_since, "visittime", _prepare_web)
+transcripts_cache = SyncedTable("transcripts", queries.transcripts_since, "created_at", _prepare_transcripts)
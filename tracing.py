@@ -0,0 +1,194 @@
+# tracing.py
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Optional
+import streamlit as st
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except ImportError:
+    get_script_run_ctx = None
+
+TRACE_SETTINGS = st.secrets.get("tracing", {})
+# Any of "memory" (feeds the in-app Performance panel), "log" and "json".
+EXPORTERS = TRACE_SETTINGS.get("exporters", ["memory"])
+JSON_PATH = TRACE_SETTINGS.get("json_path", "traces.jsonl")
+MAX_RECENT_TRACES = 50
+# Sessions whose recent traces are kept; the least recently active is dropped first.
+MAX_SESSIONS = 100
+
+logger = logging.getLogger("tracing")
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+def _session_id() -> Optional[str]:
+    # The Streamlit session running this script, or None on threads outside one.
+    if get_script_run_ctx is None:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else None
+
+class Span:
+    # A timed unit of work. Spans opened while another is current become its
+    # children; a span with no parent is the root of a trace and is exported when it ends.
+    def __init__(self, name: str, kind: str, parent: Optional["Span"] = None, attrs: Optional[dict] = None):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.session_id = parent.session_id if parent else _session_id()
+        self.attrs = dict(attrs or {})
+        self.children = []
+        self.error = None
+        self.started_at = time.time()
+        self.duration = None
+        self._t0 = time.perf_counter()
+        if parent is not None:
+            parent.children.append(self)
+
+    @property
+    def elapsed(self) -> float:
+        return self.duration if self.duration is not None else time.perf_counter() - self._t0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, error: Optional[str] = None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._t0
+        if error:
+            self.error = error
+        if self.parent is None:
+            export(self)
+
+    def walk(self, depth: int = 0):
+        yield depth, self
+        for child in list(self.children):
+            yield from child.walk(depth + 1)
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "kind": self.kind,
+            "started_at": self.started_at,
+            "duration": round(self.elapsed, 4),
+            "error": self.error,
+            "attrs": self.attrs,
+            "children": [c.as_dict() for c in list(self.children)],
+        }
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attrs):
+    s = Span(name, kind, _current.get(), attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = str(e) or type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+def trace(name: str, **attrs):
+    # Root span for one user-visible response.
+    return span(name, "request", **attrs)
+
+def start_span(name: str, kind: str = "internal", **attrs) -> Span:
+    # For work that spans generator yields (streams): attaches to the current span
+    # but does not become current, so the caller's later spans don't nest under it.
+    return Span(name, kind, _current.get(), attrs)
+
+def traced(name: Optional[str] = None, kind: str = "internal"):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__qualname__, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def bind(fn):
+    # Runs fn in a copy of the caller's context so spans opened on a worker thread
+    # nest under the span that submitted the work. Bind once per submission.
+    return functools.partial(contextvars.copy_context().run, fn)
+
+def breakdown(root: Span) -> dict:
+    # Self time per kind (a span's duration minus its children's), i.e. where the
+    # response's seconds went. Parallel children can exceed the parent; clamp at zero.
+    totals = {}
+    for _, s in root.walk():
+        own = s.elapsed - sum(c.elapsed for c in list(s.children))
+        totals[s.kind] = totals.get(s.kind, 0.0) + max(0.0, own)
+    return {k: round(v, 4) for k, v in sorted(totals.items(), key=lambda kv: -kv[1])}
+
+# -------------------- Exporters -------------------- #
+class MemoryExporter:
+    # Recent traces per Streamlit session, so one user's panel never shows another's
+    # requests. Traces started outside a session (background jobs) aren't kept.
+    def __init__(self, max_traces=MAX_RECENT_TRACES, max_sessions=MAX_SESSIONS):
+        self.max_traces = max_traces
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, root: Span):
+        if root.session_id is None:
+            return
+        with self._lock:
+            traces = self._sessions.pop(root.session_id, None) or deque(maxlen=self.max_traces)
+            traces.append(root)
+            self._sessions[root.session_id] = traces
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def traces(self, session_id: Optional[str]) -> list:
+        with self._lock:
+            return list(self._sessions.get(session_id, ()))
+
+class LogExporter:
+    def export(self, root: Span):
+        for depth, s in root.walk():
+            logger.info("trace=%s %s%s kind=%s ms=%.1f%s", root.trace_id, "  " * depth, s.name, s.kind,
+                        s.elapsed * 1000, f" error={s.error}" if s.error else "")
+
+class JsonFileExporter:
+    def __init__(self, path=JSON_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, root: Span):
+        line = json.dumps(root.as_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+memory_exporter = MemoryExporter()
+_exporters = []
+
+def register_exporter(exporter):
+    _exporters.append(exporter)
+
+def export(root: Span):
+    for exporter in list(_exporters):
+        try:
+            exporter.export(root)
+        except Exception as e:
+            print(f"⚠️ Trace export failed ({type(exporter).__name__}): {e}")
+
+def recent_traces(session_id: Optional[str] = None) -> list:
+    # Oldest first; defaults to the calling session.
+    return memory_exporter.traces(session_id or _session_id())
+
+_BUILTIN_EXPORTERS = {"memory": lambda: memory_exporter, "log": LogExporter, "json": JsonFileExporter}
+for _name in EXPORTERS:
+    register_exporter(_BUILTIN_EXPORTERS[_name]())
@@ -0,0 +1,203 @@
+# url_fetcher.py
+# Concurrent page fetching for web_utils. One httpx.AsyncClient (a shared
+# connection pool) runs on a private event loop thread, so Streamlit code can
+# call fetch()/fetch_many() synchronously. Extracted text is cached on disk:
+# fresh entries are served without a request, stale ones are revalidated
+# with If-None-Match / If-Modified-Since, and bodies are cut off at MAX_BYTES
+# while streaming.
+import asyncio
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+import httpx
+import streamlit as st
+from tracing import span
+
+FETCH_SETTINGS = st.secrets.get("url_fetcher", {})
+CACHE_PATH = FETCH_SETTINGS.get("cache_path", ".url_cache.sqlite")
+# Served straight from the cache for this long, then revalidated until MAX_STALE.
+TTL_SECONDS = float(FETCH_SETTINGS.get("ttl_seconds", 6 * 3600))
+MAX_STALE_SECONDS = float(FETCH_SETTINGS.get("max_stale_seconds", 7 * 24 * 3600))
+MAX_BYTES = int(FETCH_SETTINGS.get("max_bytes", 2_000_000))
+MAX_CONNECTIONS = int(FETCH_SETTINGS.get("max_connections", 20))
+PER_HOST_LIMIT = int(FETCH_SETTINGS.get("per_host_limit", 4))
+TIMEOUT = float(FETCH_SETTINGS.get("timeout", 10))
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+@dataclass
+class FetchResult:
+    url: str
+    text: str = ""
+    status: Optional[int] = None
+    cached: bool = False
+    revalidated: bool = False
+    truncated: bool = False
+    error: Optional[str] = None
+
+class PageCache:
+    # Extracted text per URL plus the validators needed to revalidate it.
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, text TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+                "truncated INTEGER NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, url: str) -> Optional[dict]:
+        with self._lock:
+            try:
+                row = self._db().execute(
+                    "SELECT text, etag, last_modified, truncated, fetched_at FROM pages WHERE url = ?", (url,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"⚠️ URL cache read failed: {e}")
+                return None
+        if not row:
+            return None
+        return {"text": row[0], "etag": row[1], "last_modified": row[2], "truncated": bool(row[3]), "fetched_at": row[4]}
+
+    def put(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str], truncated: bool):
+        with self._lock:
+            try:
+                self._db().execute(
+                    "INSERT OR REPLACE INTO pages (url, text, etag, last_modified, truncated, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, text, etag, last_modified, int(truncated), time.time()),
+                )
+                self._db().commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ URL cache write failed: {e}")
+
+    def touch(self, url: str):
+        with self._lock:
+            try:
+                self._db().execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+                self._db().commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ URL cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            try:
+                self._db().execute("DELETE FROM pages")
+                self._db().commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ URL cache clear failed: {e}")
+
+class URLFetcher:
+    def __init__(self, extract: Callable[[str], str], cache: Optional[PageCache] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.extract = extract
+        self.cache = cache or PageCache()
+        self._transport = transport
+        self._loop = None
+        self._client = None
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="url-fetcher", daemon=True).start()
+            return self._loop
+
+    def set_transport(self, transport: Optional[httpx.AsyncBaseTransport]):
+        # Swaps the network layer (e.g. httpx.MockTransport in the offline benchmark).
+        with self._lock:
+            self._transport = transport
+            self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Only touched on the loop thread.
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=HEADERS, timeout=TIMEOUT, follow_redirects=True, transport=self._transport,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            )
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+        return self._host_limits[host]
+
+    async def _read_capped(self, response: httpx.Response):
+        body, truncated = bytearray(), False
+        async for piece in response.aiter_bytes():
+            body.extend(piece)
+            if len(body) >= MAX_BYTES:
+                del body[MAX_BYTES:]
+                truncated = True
+                break
+        return bytes(body), truncated
+
+    async def _fetch(self, url: str) -> FetchResult:
+        entry = self.cache.get(url)
+        age = time.time() - entry["fetched_at"] if entry else None
+        if entry and age < TTL_SECONDS:
+            return FetchResult(url, entry["text"], cached=True, truncated=entry["truncated"])
+        if entry and age > MAX_STALE_SECONDS:
+            entry = None
+
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        async with self._host_limit(url):
+            try:
+                async with self._get_client().stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and entry:
+                        self.cache.touch(url)
+                        return FetchResult(url, entry["text"], 304, cached=True, revalidated=True,
+                                           truncated=entry["truncated"])
+                    if response.status_code >= 400:
+                        return FetchResult(url, status=response.status_code, error=f"HTTP {response.status_code}")
+                    body, truncated = await self._read_capped(response)
+                    html = body.decode(response.encoding or "utf-8", errors="replace")
+                    etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+                    status = response.status_code
+            except Exception as e:
+                return FetchResult(url, error=str(e))
+
+        # Parsing is CPU-bound; keep it off the loop so other downloads carry on.
+        try:
+            text = await asyncio.to_thread(self.extract, html)
+        except Exception as e:
+            return FetchResult(url, status=status, error=f"extraction failed: {e}")
+        self.cache.put(url, text, etag, last_modified, truncated)
+        return FetchResult(url, text, status, truncated=truncated)
+
+    async def _fetch_all(self, urls: list) -> list:
+        return await asyncio.gather(*(self._fetch(url) for url in urls))
+
+    def fetch_many(self, urls: list) -> list:
+        # Results come back in the order of urls; duplicates are fetched once.
+        unique = list(dict.fromkeys(urls))
+        with span("http.fetch_many", "http", urls=len(unique)) as s:
+            future = asyncio.run_coroutine_threadsafe(self._fetch_all(unique), self._ensure_loop())
+            results = dict(zip(unique, future.result()))
+            s.set(
+                cached=sum(r.cached and not r.revalidated for r in results.values()),
+                revalidated=sum(r.revalidated for r in results.values()),
+                errors=sum(r.error is not None for r in results.values()),
+            )
+        return [results[url] for url in urls]
+
+    def fetch(self, url: str) -> FetchResult:
+        return self.fetch_many([url])[0]
@@ -0,0 +1,160 @@
+# vector_index.py
+# Local similarity index for deployments without pgvector. Embeddings live in
+# one L2-normalized matrix in a memory-mapped .npy per corpus, so a cold start
+# maps the file instead of pulling every embedding out of Postgres.
+import json
+import os
+import threading
+from typing import Optional
+import numpy as np
+import streamlit as st
+
+INDEX_SETTINGS = st.secrets.get("vector_index", {})
+INDEX_DIR = INDEX_SETTINGS.get("path", ".vector_index")
+# int8 stores each unit-length row scaled by 127: a quarter of the float32 memory.
+QUANTIZE = bool(INDEX_SETTINGS.get("int8", False))
+INITIAL_CAPACITY = 1024
+SEARCH_CHUNK_ROWS = 65536
+INT8_SCALE = 127.0
+DELETED_ID = -1
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class MmapIndex:
+    # One (capacity, dim) matrix in a memory-mapped .npy plus a parallel ids
+    # array. Rows [0, count) are live; appends fill spare capacity in place and
+    # the files only get copied when capacity doubles. Deleted rows keep their
+    # slot with id -1 and are skipped by search.
+    def __init__(self, name: str, directory: str = INDEX_DIR, quantize: bool = QUANTIZE):
+        self.name = name
+        self.directory = directory
+        self.quantize = quantize
+        self._lock = threading.RLock()
+        self.vectors = None
+        self.ids = None
+        self.count = 0
+        self.last_id = None
+
+    def _path(self, suffix: str) -> str:
+        return os.path.join(self.directory, f"{self.name}.{suffix}")
+
+    @property
+    def dtype(self):
+        return np.int8 if self.quantize else np.float32
+
+    def exists(self) -> bool:
+        return os.path.exists(self._path("meta.json"))
+
+    def open(self) -> bool:
+        # Cold start is two mmaps and a small JSON read; nothing is loaded until searched.
+        with self._lock:
+            if self.vectors is not None:
+                return True
+            if not self.exists():
+                return False
+            with open(self._path("meta.json")) as f:
+                meta = json.load(f)
+            self.quantize = meta["quantize"]
+            self.count = meta["count"]
+            self.last_id = meta.get("last_id")
+            self.vectors = np.load(self._path("vectors.npy"), mmap_mode="r+")
+            self.ids = np.load(self._path("ids.npy"), mmap_mode="r+")
+            return True
+
+    def _save_meta(self):
+        with open(self._path("meta.json"), "w") as f:
+            json.dump({"count": self.count, "last_id": self.last_id, "quantize": self.quantize,
+                       "dim": self.vectors.shape[1]}, f)
+
+    def _allocate(self, capacity: int, dim: int):
+        os.makedirs(self.directory, exist_ok=True)
+        vectors = np.lib.format.open_memmap(self._path("vectors.tmp.npy"), mode="w+", dtype=self.dtype, shape=(capacity, dim))
+        ids = np.lib.format.open_memmap(self._path("ids.tmp.npy"), mode="w+", dtype=np.int64, shape=(capacity,))
+        ids[:] = DELETED_ID
+        if self.vectors is not None:
+            vectors[:self.count] = self.vectors[:self.count]
+            ids[:self.count] = self.ids[:self.count]
+        vectors.flush()
+        ids.flush()
+        del vectors, ids
+        os.replace(self._path("vectors.tmp.npy"), self._path("vectors.npy"))
+        os.replace(self._path("ids.tmp.npy"), self._path("ids.npy"))
+        self.vectors = np.load(self._path("vectors.npy"), mmap_mode="r+")
+        self.ids = np.load(self._path("ids.npy"), mmap_mode="r+")
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        unit = normalize(vectors)
+        if self.quantize:
+            return np.clip(np.round(unit * INT8_SCALE), -127, 127).astype(np.int8)
+        return unit
+
+    def add(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        encoded = self._encode(vectors)
+        with self._lock:
+            self.open()
+            if self.vectors is None:
+                self._allocate(max(INITIAL_CAPACITY, len(ids)), encoded.shape[1])
+            elif self.count + len(ids) > len(self.ids):
+                self._allocate(max(2 * len(self.ids), self.count + len(ids)), self.vectors.shape[1])
+            end = self.count + len(ids)
+            self.vectors[self.count:end] = encoded
+            self.ids[self.count:end] = ids
+            self.count = end
+            self.last_id = max(int(ids.max()), self.last_id if self.last_id is not None else int(ids.max()))
+            self.vectors.flush()
+            self.ids.flush()
+            self._save_meta()
+
+    def remove(self, ids):
+        with self._lock:
+            if not self.open() or not self.count:
+                return
+            live = self.ids[:self.count]
+            live[np.isin(live, np.asarray(list(ids), dtype=np.int64))] = DELETED_ID
+            self.ids.flush()
+
+    def max_id(self) -> Optional[int]:
+        # Highest id ever added, deleted or not: the watermark for incremental sync.
+        with self._lock:
+            self.open()
+            return self.last_id
+
+    def search(self, queries: np.ndarray, k: int, allowed_ids=None):
+        # Batched top-k cosine search. queries is (q, dim); returns (ids, distances),
+        # each (q, <=k), nearest first. Rows are scanned in chunks so the score
+        # matrix stays small however large the index grows.
+        queries = normalize(queries)
+        q = len(queries)
+        with self._lock:
+            if not self.open() or not self.count or k <= 0:
+                return np.empty((q, 0), np.int64), np.empty((q, 0), np.float32)
+            count, vectors, ids = self.count, self.vectors, self.ids
+        allowed = None if allowed_ids is None else np.asarray(list(allowed_ids), dtype=np.int64)
+        best_ids = np.empty((q, 0), np.int64)
+        best_scores = np.empty((q, 0), np.float32)
+        for start in range(0, count, SEARCH_CHUNK_ROWS):
+            chunk_ids = np.asarray(ids[start:start + SEARCH_CHUNK_ROWS][:count - start])
+            mask = chunk_ids != DELETED_ID
+            if allowed is not None:
+                mask &= np.isin(chunk_ids, allowed)
+            if not mask.any():
+                continue
+            chunk = np.asarray(vectors[start:start + len(chunk_ids)])[mask]
+            scores = (chunk.astype(np.float32) @ queries.T).T
+            if self.quantize:
+                scores /= INT8_SCALE
+            candidate_ids = np.broadcast_to(chunk_ids[mask], scores.shape)
+            best_ids = np.concatenate([best_ids, candidate_ids], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_ids = np.take_along_axis(best_ids, top, axis=1)
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_ids, order, axis=1), 1.0 - np.take_along_axis(best_scores, order, axis=1)
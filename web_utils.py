@@ -1,92 +1,82 @@
 import os
 import re
-import requests
-import psycopg2
 import pandas as pd
 from datetime import datetime
-from bs4 import BeautifulSoup
-from groq import Groq
 import streamlit as st
-import time
-from eval_utils import g_eval, if_eval, halu_eval, truthful_qa_eval
-
-# === Groq API Client ===
-GROQ_API_KEY = st.secrets["groq"]["api_key"]
-groq_client = Groq(api_key=GROQ_API_KEY)
+from eval_utils import evaluate_all
+from llm_client import complete, stream, FailedStream, DEFAULT_MODEL
+from tracing import traced
+from table_cache import web_visits_cache
+import queries
+import retrieval
+import context_builder
+from url_fetcher import URLFetcher
+import html_text
 
 # === Tavily API Client ===
 TAVILY_API_KEY = st.secrets["tavily"]["api_key"]
 from tavily import TavilyClient
 tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
 
-# === PostgreSQL DB Config ===
-DB_CONFIG = {
-    "host": "vijayrag.c9uac2i2ihy2.us-east-1.rds.amazonaws.com",
-    "port": 5432,
-    "user": "vijay_admin",
-    "password": "vijay_secure_password_2025",
-    "database": "mydatabase"
-}
+# Context in every web prompt is packed to this many tokens; raw page text is only capped for memory.
+CONTEXT_BUDGET = context_builder.budget_for(DEFAULT_MODEL)
+MAX_PAGE_CHARS = 200000
+# Pages fetched for "most visited in <month>" questions.
+TOP_PAGES = 3
+# None uses html_text.DEFAULT_BACKEND (the incremental stdlib parser).
+HTML_BACKEND = st.secrets.get("html", {}).get("backend")
 
 # === DB Utilities ===
-def connect_db():
+@traced("db.fetch_web_data", "db")
+def fetch_web_data():
+    # Served from the local sync cache, already parsed and with visitDate added.
     try:
-        return psycopg2.connect(**DB_CONFIG)
+        return web_visits_cache.frame()
     except Exception as e:
-        print(f"❌ Database Connection Error: {e}")
-        return None
-
-def fetch_web_data():
-    query = "SELECT * FROM webdata_embeddings_shikha_20250326"
-    conn = connect_db()
-    if conn:
-        try:
-            df = pd.read_sql(query, conn)
-            df['visittime'] = pd.to_datetime(df['visittime'], errors='coerce')
-            df = df.dropna(subset=['visittime'])
-            df['visitDate'] = pd.to_datetime(df['visittime'].dt.date)
-            return df
-        except Exception as e:
-            print(f"❌ Error reading data: {e}")
-            return pd.DataFrame()
-        finally:
-            conn.close()
-    return pd.DataFrame()
+        print(f"❌ Error reading data: {e}")
+        return pd.DataFrame()
 
 # === Web Extraction ===
+def html_to_text(html):
+    return html_text.extract(html, MAX_PAGE_CHARS, HTML_BACKEND)
+
+page_fetcher = URLFetcher(html_to_text)
+
+def _page_text(result):
+    return result.text if result.error is None else f"❌ Error fetching URL content: {result.error}"
+
+@traced("http.extract_text_from_url", "http")
 def extract_text_from_url(url):
-    try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        res = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(res.text, "html.parser")
-        for tag in soup(["script", "style", "noscript"]):
-            tag.decompose()
-        text = soup.get_text(separator="\n")
-        return "\n".join([line.strip() for line in text.splitlines() if line.strip()])[:15000]
-    except Exception as e:
-        return f"❌ Error fetching URL content: {e}"
+    return _page_text(page_fetcher.fetch(url))
+
+def extract_texts_from_urls(urls):
+    # Fetched concurrently; same order as urls.
+    return [_page_text(r) for r in page_fetcher.fetch_many(urls)]
 
 # === Tavily Search ===
+@traced("tavily.search", "search")
 def search_web_with_tavily(prompt):
     try:
         result = tavily_client.search(query=prompt, search_depth="advanced", include_raw_content=True)
-        content = "\n".join([r["content"] for r in result["results"] if "content" in r])
-        return content[:15000] if content else "No useful web content found."
+        chunks = [
+            chunk
+            for r in result["results"] if r.get("content")
+            for chunk in context_builder.split_text(r["content"], relevance=float(r.get("score") or 0.0))
+        ]
+        content = context_builder.pack(chunks, CONTEXT_BUDGET, prompt, recency_weight=0.0)
+        return content if content else "No useful web content found."
     except Exception as e:
         return f"❌ Web search failed: {e}"
 
 # === LLM via Groq ===
 def call_llm(prompt):
-    try:
-        start = time.time()
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-specdec",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        end = time.time()
-        return response.choices[0].message.content.strip(), round(end - start, 2)
-    except Exception as e:
-        return f"❌ LLM Error: {e}", 0
+    result = complete(prompt)
+    if result.error:
+        return f"❌ LLM Error: {result.error}", 0
+    return result.text, result.latency
+
+def call_llm_stream(prompt):
+    return stream(prompt)
 
 # === Top Visited Websites (Generic by Month & Year) ===
 def top_visited_websites(df, year, month, top_n=5):
@@ -99,64 +89,95 @@ def top_visited_websites(df, year, month, top_n=5):
     except Exception as e:
         return f"❌ Error retrieving top sites: {e}"
 
+def fetch_top_sites(year, month, top_n=5):
+    # Once the visits are cached, aggregating locally beats a round trip; before
+    # that, Postgres groups and limits so only top_n rows are transferred.
+    try:
+        if not web_visits_cache.loaded():
+            return queries.top_sites(year, month, top_n)
+        return top_visited_websites(web_visits_cache.frame(), year, month, top_n)
+    except Exception as e:
+        return f"❌ Error retrieving top sites: {e}"
+
 # === Web Evaluation ===
 def evaluate_web_response(user_prompt, llm_response):
-    g_score = g_eval(llm_response, user_prompt)
-    i_score = if_eval(llm_response, user_prompt)
-    t_score = truthful_qa_eval(llm_response)
-    return f"{g_score}\n{ i_score }\n{ t_score }"
+    return str(evaluate_all(llm_response, user_prompt))
 
 # === Prompt processor with routing ===
-def process_prompt_with_webdata(prompt, df):
-    try:
-        if "shikha" in prompt.lower():
-            return process_prompt_with_df(prompt, df)
+def build_webdata_prompt(prompt, df):
+    if "shikha" in prompt.lower():
+        return build_df_prompt(prompt, df)
 
-        url_match = re.search(r"(https?://[^\s]+)", prompt)
-        if url_match:
-            content = extract_text_from_url(url_match.group(0))
-            enriched_prompt = prompt.replace(url_match.group(0), f"\n\n{content}\n\n")
-            return call_llm(enriched_prompt)
+    url_match = re.search(r"(https?://[^\s]+)", prompt)
+    if url_match:
+        content = context_builder.pack_text(extract_text_from_url(url_match.group(0)), prompt, CONTEXT_BUDGET)
+        return prompt.replace(url_match.group(0), f"\n\n{content}\n\n")
 
-        content = search_web_with_tavily(prompt)
-        enriched = f"Use the content to answer the question:\n{content}\n\nQuestion: {prompt}"
-        return call_llm(enriched)
+    content = search_web_with_tavily(prompt)
+    return f"Use the content to answer the question:\n{content}\n\nQuestion: {prompt}"
 
+def process_prompt_with_webdata(prompt, df):
+    try:
+        return call_llm(build_webdata_prompt(prompt, df))
     except Exception as e:
         return f"❌ Error processing prompt: {e}", 0
 
+def stream_prompt_with_webdata(prompt, df):
+    try:
+        return call_llm_stream(build_webdata_prompt(prompt, df))
+    except Exception as e:
+        return FailedStream(f"❌ Error processing prompt: {e}")
+
 # === Vector DB Handler for Shikha ===
+def build_df_prompt(prompt, df):
+    url_match = re.search(r"(https?://[^\s]+)", prompt)
+    if url_match:
+        url = url_match.group(0)
+        content = context_builder.pack_text(extract_text_from_url(url), prompt, CONTEXT_BUDGET)
+        return prompt.replace(url, f"\n\n{content}\n\n")
+
+    month_match = re.search(r"(January|February|March|April|May|June|July|August|September|October|November|December)", prompt, re.IGNORECASE)
+    if month_match:
+        try:
+            df["visitDate"] = pd.to_datetime(df["visitDate"])
+            month_number = datetime.strptime(month_match.group(0), "%B").month
+            filtered = df[df["visitDate"].dt.month == month_number]
+            if not filtered.empty:
+                top_urls = filtered.sort_values("visitcount", ascending=False)["url"].drop_duplicates().head(TOP_PAGES).tolist()
+                chunks = [
+                    # Scored against the question; a small bonus on top keeps the most visited page ahead on ties.
+                    context_builder.Chunk(chunk.text, context_builder.lexical_relevance(prompt, chunk.text)
+                                          + 0.01 * (TOP_PAGES - rank))
+                    for rank, (url, text) in enumerate(zip(top_urls, extract_texts_from_urls(top_urls)))
+                    if not text.startswith("❌")
+                    for chunk in context_builder.split_text(f"[{url}]\n{text}")
+                ]
+                content = context_builder.pack(chunks, CONTEXT_BUDGET, prompt, recency_weight=0.0)
+                return f"{prompt}\n\nTop visited page content:\n{content}\n\n"
+        except Exception as e:
+            print(f"⚠️ Month parsing error: {e}")
+
+    if any(word in prompt.lower() for word in ["visit", "url", "title", "page", "click", "website", "link"]):
+        # Only the visits closest to the question go into the prompt, not the whole table.
+        try:
+            rows = retrieval.search("web", prompt)
+            context = context_builder.pack_rows(
+                rows.assign(relevance=1 - rows["distance"]), ["visittime", "url", "visitcount", "cleaned_title"],
+                prompt, CONTEXT_BUDGET, relevance_column="relevance", time_column="visittime",
+            )
+            return f"You are a smart assistant. Here are the web visits most relevant to the question:\n\n{context}\n\nNow answer:\n{prompt}"
+        except Exception as e:
+            print(f"⚠️ Retrieval failed, ranking the visit table by keywords: {e}")
+        df_text = context_builder.pack_rows(
+            df, ["visitDate", "url", "visitcount", "cleaned_title"], prompt, CONTEXT_BUDGET, time_column="visitDate",
+        )
+        return f"You are a smart assistant. Here is some web visit data:\n\n{df_text}\n\nNow answer:\n{prompt}"
+
+    content = search_web_with_tavily(prompt)
+    return f"Based on this web search result, answer the query:\n\n{content}\n\nQuestion: {prompt}"
+
 def process_prompt_with_df(prompt, df):
     try:
-        url_match = re.search(r"(https?://[^\s]+)", prompt)
-        if url_match:
-            url = url_match.group(0)
-            content = extract_text_from_url(url)
-            enriched_prompt = prompt.replace(url, f"\n\n{content}\n\n")
-            return call_llm(enriched_prompt)
-
-        month_match = re.search(r"(January|February|March|April|May|June|July|August|September|October|November|December)", prompt, re.IGNORECASE)
-        if month_match:
-            try:
-                df["visitDate"] = pd.to_datetime(df["visitDate"])
-                month_number = datetime.strptime(month_match.group(0), "%B").month
-                filtered = df[df["visitDate"].dt.month == month_number]
-                if not filtered.empty:
-                    top_url = filtered.sort_values("visitcount", ascending=False)["url"].iloc[0]
-                    content = extract_text_from_url(top_url)
-                    prompt_with_url = f"{prompt}\n\nTop visited page content:\n{content}\n\n"
-                    return call_llm(prompt_with_url)
-            except Exception as e:
-                print(f"⚠️ Month parsing error: {e}")
-
-        if any(word in prompt.lower() for word in ["visit", "url", "title", "page", "click", "website", "link"]):
-            df_text = df[["visitDate", "url", "visitcount", "cleaned_title"]].astype(str).to_string(index=False)
-            full_prompt = f"You are a smart assistant. Here is some web visit data:\n\n{df_text}\n\nNow answer:\n{prompt}"
-            return call_llm(full_prompt)
-
-        content = search_web_with_tavily(prompt)
-        final_prompt = f"Based on this web search result, answer the query:\n\n{content}\n\nQuestion: {prompt}"
-        return call_llm(final_prompt)
-
+        return call_llm(build_df_prompt(prompt, df))
     except Exception as e:
-        return f"❌ Error in Shikha's prompt handling: {e}", 0
\ No newline at end of file
+        return f"❌ Error in Shikha's prompt handling: {e}", 0
@@ -1,35 +1,37 @@
 # zoom_utils.py
-import os, base64, pytz, requests, psycopg2
+import os, base64, pytz, requests
 import pandas as pd
+import threading
 import time
 from datetime import datetime, timedelta
-from email.mime.text import MIMEText
 from googleapiclient.discovery import build
 import streamlit as st
 from auth_utils import authenticate_google
+from table_cache import transcripts_cache
+import queries
+import retrieval
+import context_builder
+import meeting_summary
+import gmail_utils
 from eval_utils import g_eval, if_eval, halu_eval, truthful_qa_eval
+from eval_queue import eval_queue
+from llm_client import DEFAULT_MODEL, FailedStream
+from tracing import span, traced
 
 ZOOM_CLIENT_ID = st.secrets["zoom"]["client_id"]
 ZOOM_CLIENT_SECRET = st.secrets["zoom"]["client_secret"]
 ZOOM_ACCOUNT_ID = st.secrets["zoom"]["account_id"]
-GROQ_API_KEY = st.secrets["groq"]["api_key"]
-from groq import Groq
-groq_client = Groq(api_key=GROQ_API_KEY)
-
-DB_CONFIG = {
-    "host": "vijayrag.c9uac2i2ihy2.us-east-1.rds.amazonaws.com",
-    "port": 5432,
-    "user": "vijay_admin",
-    "password": "vijay_secure_password_2025",
-    "database": "mydatabase"
-}
+# Seconds to wait on any Zoom call; a hung request would otherwise hold up scheduling.
+ZOOM_TIMEOUT = float(st.secrets["zoom"].get("timeout", 15))
 
-def add_to_calendar(topic, start_time, duration, time_zone, zoom_link):
-    start = time.time()
+def get_calendar_service():
     creds = authenticate_google()
     if not creds:
-        return "❌ Google authentication failed", 0
-    service = build("calendar", "v3", credentials=creds)
+        raise Exception("❌ Google authentication failed for Calendar.")
+    return build("calendar", "v3", credentials=creds)
+
+def create_calendar_event(topic, start_time, duration, time_zone, zoom_link, service=None):
+    service = service or get_calendar_service()
     end_time = start_time + timedelta(minutes=duration)
     event = {
         "summary": topic,
@@ -39,17 +41,25 @@ def add_to_calendar(topic, start_time, duration, time_zone, zoom_link):
         "end": {"dateTime": end_time.isoformat(), "timeZone": time_zone},
         "reminders": {"useDefault": True}
     }
-    created_event = service.events().insert(calendarId="primary", body=event).execute()
-    return created_event.get("htmlLink"), round(time.time() - start, 2)
+    with span("calendar.events.insert", "google"):
+        return service.events().insert(calendarId="primary", body=event).execute()
 
-def send_email_reminder(subject, body, recipients):
-    start = time.time()
-    creds = authenticate_google()
-    if not creds:
-        return False, 0
-    service = build("gmail", "v1", credentials=creds)
-    for email in recipients:
-        html_body = f"""<html><body>
+def delete_calendar_event(event_id, service=None):
+    service = service or get_calendar_service()
+    with span("calendar.events.delete", "google"):
+        service.events().delete(calendarId="primary", eventId=event_id).execute()
+
+def add_to_calendar(topic, start_time, duration, time_zone, zoom_link):
+    with span("calendar.add_to_calendar", "google") as s:
+        try:
+            service = get_calendar_service()
+        except Exception:
+            return "❌ Google authentication failed", 0
+        created_event = create_calendar_event(topic, start_time, duration, time_zone, zoom_link, service)
+        return created_event.get("htmlLink"), round(s.elapsed, 2)
+
+def invitation_html(subject, body):
+    return f"""<html><body>
         <p>Hi there,</p>
         <p>You are invited to the following Zoom meeting:</p>
         <p><strong>📌 Topic:</strong> {subject.replace('📌 Zoom Meeting: ', '')}<br>
@@ -57,16 +67,50 @@ def send_email_reminder(subject, body, recipients):
         <strong>🔗 Join Zoom Meeting:</strong> <a href="{body.get('link')}">{body.get('link')}</a></p>
         <p>Please join on time.</p>
         <p>Regards,<br>Shikha</p></body></html>"""
-        msg = MIMEText(html_body, "html")
-        msg["to"] = email
-        msg["from"] = "me"
-        msg["subject"] = subject
-        raw = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-        message = {"raw": raw}
-        service.users().messages().send(userId="me", body=message).execute()
-    return True, round(time.time() - start, 2)
 
+@traced("gmail.send_invitations", "google")
+def send_invitations(subject, body, recipients, single_message=False):
+    # One message per recipient by default, all sent in Gmail batch requests.
+    # single_message=True sends one message with everyone in Bcc instead; the
+    # invitation isn't personalized, so nothing is lost, but delivery is all or nothing.
+    recipients = [r for r in dict.fromkeys(recipients) if r]
+    html_body = invitation_html(subject, body)
+    if single_message:
+        label = ", ".join(recipients)
+        messages = {label: gmail_utils.build_message("", subject, html_body, bcc=label)}
+    else:
+        messages = {r: gmail_utils.build_message(r, subject, html_body) for r in recipients}
+    return gmail_utils.send_bulk(messages) if messages else []
+
+def send_email_reminder(subject, body, recipients, single_message=False):
+    start = time.time()
+    try:
+        results = send_invitations(subject, body, recipients, single_message)
+    except Exception as e:
+        print(f"⚠️ Sending invitations failed: {e}")
+        return False, round(time.time() - start, 2)
+    for result in results:
+        if not result.ok:
+            print(f"⚠️ Invitation to {result.recipient} failed after {result.attempts} attempt(s): {result.error}")
+    return all(r.ok for r in results), round(time.time() - start, 2)
+
+# Server-to-server OAuth tokens last an hour; reuse one instead of fetching it per meeting.
+_zoom_token = {"value": None, "expires_at": 0.0}
+_zoom_token_lock = threading.Lock()
+
+def _cached_zoom_token():
+    with _zoom_token_lock:
+        if _zoom_token["value"] and time.time() < _zoom_token["expires_at"]:
+            return _zoom_token["value"]
+    return None
+
+@traced("zoom.access_token", "zoom")
 def get_zoom_access_token():
+    # The token request runs outside the lock, so a slow Zoom never blocks readers
+    # of a valid token. Concurrent refreshes may both fetch; the later one is kept.
+    token = _cached_zoom_token()
+    if token:
+        return token
     auth_string = f"{ZOOM_CLIENT_ID}:{ZOOM_CLIENT_SECRET}"
     auth_base64 = base64.b64encode(auth_string.encode("utf-8")).decode("utf-8")
     headers = {
@@ -74,18 +118,31 @@ def get_zoom_access_token():
         "Content-Type": "application/x-www-form-urlencoded"
     }
     data = {"grant_type": "account_credentials", "account_id": ZOOM_ACCOUNT_ID}
-    response = requests.post("https://zoom.us/oauth/token", headers=headers, data=data)
-    return response.json().get("access_token")
+    payload = requests.post("https://zoom.us/oauth/token", headers=headers, data=data, timeout=ZOOM_TIMEOUT).json()
+    token = payload.get("access_token")
+    if not token:
+        # Another thread may have refreshed while this request failed.
+        return _cached_zoom_token()
+    with _zoom_token_lock:
+        # Renewed a minute early so a token never expires mid-request.
+        _zoom_token.update(value=token, expires_at=time.time() + float(payload.get("expires_in", 3600)) - 60)
+    return token
 
-def schedule_zoom_meeting(topic, start_time, duration, time_zone):
-    start = time.time()
-    access_token = get_zoom_access_token()
-    if not access_token:
-        return None, "❌ Zoom access token error.", 0
-    headers = {
+def clear_zoom_token():
+    with _zoom_token_lock:
+        _zoom_token.update(value=None, expires_at=0.0)
+
+def zoom_headers(access_token):
+    return {
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
+
+def create_zoom_meeting(topic, start_time, duration, time_zone):
+    # Returns (meeting, status); meeting is Zoom's response (id, join_url, ...) or None.
+    access_token = get_zoom_access_token()
+    if not access_token:
+        return None, "❌ Zoom access token error."
     tz = pytz.timezone(time_zone)
     zoom_time = tz.localize(start_time).astimezone(pytz.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
     meeting_data = {
@@ -102,70 +159,126 @@ def schedule_zoom_meeting(topic, start_time, duration, time_zone):
             "auto_recording": "cloud"
         }
     }
-    res = requests.post("https://api.zoom.us/v2/users/me/meetings", headers=headers, json=meeting_data)
-    duration_sec = round(time.time() - start, 2)
-
+    with span("zoom.meetings.create", "zoom"):
+        res = requests.post("https://api.zoom.us/v2/users/me/meetings", headers=zoom_headers(access_token),
+                            json=meeting_data, timeout=ZOOM_TIMEOUT)
     if res.status_code == 201:
-        join_url = res.json().get("join_url")
-        agenda_text = meeting_data["agenda"]
-        input_struct = {"topic": topic, "start_time": start_time.isoformat(), "duration": duration}
-        halu_score = halu_eval(agenda_text, input_struct)
-        print("[HALUeval - Zoom Agenda]", halu_score)
-        return join_url, "✅ Zoom meeting scheduled!", duration_sec
-    else:
-        return None, f"❌ Zoom scheduling failed: {res.json()}", duration_sec
+        return res.json(), "✅ Zoom meeting scheduled!"
+    if res.status_code == 401:
+        clear_zoom_token()  # revoked early; fetch a fresh one next time
+    return None, f"❌ Zoom scheduling failed: {res.json()}"
+
+def delete_zoom_meeting(meeting_id):
+    access_token = get_zoom_access_token()
+    with span("zoom.meetings.delete", "zoom"):
+        res = requests.delete(f"https://api.zoom.us/v2/meetings/{meeting_id}", headers=zoom_headers(access_token),
+                              timeout=ZOOM_TIMEOUT)
+    if res.status_code not in (200, 204, 404):
+        raise Exception(f"❌ Zoom meeting delete failed: HTTP {res.status_code}")
 
-def connect_to_db():
+def submit_agenda_eval(topic, start_time, duration):
+    # Queued, never awaited: the judge call runs after the meeting is booked.
+    agenda_text = f"{topic} discussion"
+    input_struct = {"topic": topic, "start_time": start_time.isoformat(), "duration": duration}
+    eval_queue.submit_job(
+        "zoom_agenda",
+        lambda: {"halu_eval": halu_eval(agenda_text, input_struct)},
+        agenda_text, str(input_struct),
+    )
+
+def schedule_zoom_meeting(topic, start_time, duration, time_zone):
+    with span("zoom.schedule_meeting", "zoom") as s:
+        meeting, status = create_zoom_meeting(topic, start_time, duration, time_zone)
+        duration_sec = round(s.elapsed, 2)
+        if meeting:
+            submit_agenda_eval(topic, start_time, duration)
+            return meeting.get("join_url"), status, duration_sec
+        return None, status, duration_sec
+
+@traced("db.fetch_transcripts", "db")
+def fetch_transcripts():
+    # Served from the local sync cache; only rows newer than its watermark hit Postgres.
     try:
-        return psycopg2.connect(**DB_CONFIG)
+        return transcripts_cache.frame().sort_values(by="created_at", ascending=False)
     except Exception as e:
         print("❌ DB Error:", e)
-        return None
-
-@st.cache_data
-def fetch_transcripts():
-    conn = connect_to_db()
-    if not conn:
-        return pd.DataFrame()
-    df = pd.read_sql("SELECT * FROM meeting_embeddings_shikha_20250401_new_6 WHERE category <> 'chats';", conn)
-    df["created_at"] = pd.to_datetime(df["created_at"], errors="coerce")
-    return df
+        return pd.DataFrame(columns=["id", "category", "content"]).assign(created_at=pd.Series(dtype="datetime64[ns]"))
 
-def get_transcripts():
-    return fetch_transcripts()
+def fetch_latest_transcripts(limit=20):
+    return fetch_transcripts().head(limit)
 
-def summarize_meetings(df):
-    if df.empty:
-        return "⚠️ No transcript data to summarize.", None, 0
-    start = time.time()
-    content = " ".join(df.sort_values(by="created_at", ascending=False)["content"].tolist())[:4000]
+def get_transcripts(day=None):
+    # Only the rows the meeting view needs: one day's meetings, or the most recent ones.
+    # Until the transcript cache is loaded, Postgres returns just that day's rows.
+    if day is None:
+        return fetch_latest_transcripts()
     try:
-        summary = groq_client.chat.completions.create(
-            model="llama-3.3-70b-specdec",
-            messages=[{"role": "user", "content": f"Summarize this meeting transcript: {content}"}]
-        ).choices[0].message.content
+        if not transcripts_cache.loaded():
+            return queries.transcripts_on(day)
+    except Exception as e:
+        print("❌ DB Error:", e)
+    df = fetch_transcripts()
+    return df[df["created_at"].dt.date == day]
+
+def meeting_content(df, focus=None, budget=None):
+    # Transcripts are chunked and packed into the model's token budget, most
+    # recent first, or most similar to the focus when one is given; the chosen
+    # chunks are then read in meeting order.
+    ordered = df.sort_values(by="created_at")
+    relevance = {}
+    if focus:
+        try:
+            ranked = retrieval.rank_ids("meetings", focus, ordered["id"])
+            relevance = {i: 1 - n / len(ranked) for n, i in enumerate(ranked)}
+        except Exception as e:
+            print(f"⚠️ Meeting retrieval failed, using the latest transcripts: {e}")
+    chunks = [
+        chunk
+        for row in ordered.to_dict("records")
+        for chunk in context_builder.split_text(row["content"] or "", timestamp=row["created_at"],
+                                                relevance=relevance.get(row["id"], 0.0))
+    ]
+    return context_builder.pack(chunks, budget or context_builder.budget_for(DEFAULT_MODEL),
+                                focus, order="original")
 
-        sentiment = groq_client.chat.completions.create(
-            model="llama-3.3-70b-specdec",
-            messages=[{"role": "user", "content": f"Analyze the sentiment of this meeting transcript:\n\n{content}"}]
-        ).choices[0].message.content
+def stream_meeting_summary(df, focus=None):
+    # Map-reduce over every transcript; only the final combine is streamed, as one
+    # reply holding both sections (split with meeting_summary.split_sections).
+    try:
+        return meeting_summary.stream_summary(df, focus)
+    except Exception as e:
+        # Empty transcripts, or a map/reduce call that failed (rate limit, timeout).
+        print("❌ Error in summarizing/sentiment:", e)
+        return FailedStream("❌ Failed to generate summary.")
 
-        g_score = g_eval(summary, reference=content)
-        if_score = if_eval(summary, source=content)
-        truth_score = truthful_qa_eval(sentiment)
+def submit_meeting_eval(summary, sentiment, content, generation=None):
+    # The sentiment is judged on its own, so the three metrics run as one background job.
+    return eval_queue.submit_job(
+        "meeting_summary",
+        lambda: {
+            "g_eval": g_eval(summary, reference=content),
+            "if_eval": if_eval(summary, source=content),
+            "truthful_qa": truthful_qa_eval(sentiment),
+        },
+        summary + "\n\n" + sentiment, content, generation,
+    )
 
-        print("[G-Eval]", g_score)
-        print("[IFEval]", if_score)
-        print("[TruthfulQA Sentiment Eval]", truth_score)
+def summarize_meetings(df, focus=None):
+    with span("meetings.summarize", "internal") as s:
+        if df.empty:
+            return "⚠️ No transcript data to summarize.", None, 0
+        result = meeting_summary.summarize(df, focus)
+        if result.error:
+            print("❌ Error in summarizing/sentiment:", result.error)
+            return "❌ Failed to generate summary.", "❌ Failed to analyze sentiment.", round(s.elapsed, 2)
 
-        return summary.strip(), sentiment.strip(), round(time.time() - start, 2)
+        submit_meeting_eval(result.summary, result.sentiment, meeting_content(df, focus))
 
-    except Exception as e:
-        print("❌ Error in summarizing/sentiment:", e)
-        return "❌ Failed to generate summary.", "❌ Failed to analyze sentiment.", round(time.time() - start, 2)
+        summary = f"{result.summary}\n\n{result.notice}" if result.notice else result.summary
+        return summary, result.sentiment, round(s.elapsed, 2)
 
 def summarize_latest_meeting():
-    df = fetch_transcripts()
+    df = fetch_latest_transcripts(1)
     if df.empty:
         return None, None, 0
-    return summarize_meetings(df.head(1))
\ No newline at end of file
+    return summarize_meetings(df)
\ No newline at end of file